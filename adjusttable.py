@@ -0,0 +1,87 @@
+import numpy as np
+
+# adjust.ini point keys and corrections, as save_adjustment_template writes them
+keys = ['p_lo', 'f_lo', 'p_rf', 'f_rf']   # dBm, GHz, dBm, GHz
+corrections = ['kp_loss', 'a_err_db', 'ph_err', 'a_zk']
+
+
+class AdjustTable:
+    def __init__(self, points, values, match='interp'):
+        self.points = np.asarray(points, dtype=float).reshape(-1, len(keys))
+        self.values = np.asarray(values, dtype=float).reshape(-1, len(corrections))
+        self.match = match   # 'exact' -- grid points only, 'nearest' or 'interp' -- by frequency within the nearest powers
+
+        self._index = {_key(point): i for i, point in enumerate(self.points.tolist())}
+
+        # off-grid distance: one grid step on any axis counts the same
+        self._steps = np.array([_step(self.points[:, i]) for i in range(len(keys))])
+
+    def __bool__(self):
+        return bool(len(self.points))
+
+    def __len__(self):
+        return len(self.points)
+
+    @classmethod
+    def from_list(cls, adjustment, match='interp'):
+        if not adjustment:
+            return cls([], [], match=match)
+        return cls(
+            [[point[k] for k in keys] for point in adjustment],
+            [[point[k] for k in corrections] for point in adjustment],
+            match=match,
+        )
+
+    def lookup(self, p_lo, f_lo, p_rf, f_rf):
+        return self.lookup_many([p_lo], [f_lo], [p_rf], [f_rf])[0]
+
+    def lookup_many(self, p_lo, f_lo, p_rf, f_rf):
+        # rows of corrections for the given points, points not covered by the table get zeros
+        query = np.stack(np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (p_lo, f_lo, p_rf, f_rf))), axis=1)
+        out = np.zeros((len(query), len(corrections)))
+        if not self:
+            return out
+
+        rows = np.array([self._index.get(_key(point), -1) for point in query.tolist()], dtype=int)
+        hit = rows >= 0
+        out[hit] = self.values[rows[hit]]
+
+        miss = np.flatnonzero(~hit)
+        if not len(miss) or self.match == 'exact':
+            return out
+        if self.match == 'nearest':
+            out[miss] = self.values[self._nearest(query[miss])]
+        else:
+            out[miss] = self._interp(query[miss])
+        return out
+
+    def _nearest(self, query, chunk=256):
+        # in chunks, the distance matrix of a whole run against a dense table would not fit in memory
+        nearest = np.empty(len(query), dtype=int)
+        for start in range(0, len(query), chunk):
+            part = query[start:start + chunk]
+            distance = (((part[:, None, :] - self.points[None, :, :]) / self._steps) ** 2).sum(axis=2)
+            nearest[start:start + chunk] = np.argmin(distance, axis=1)
+        return nearest
+
+    def _interp(self, query):
+        # snap to the nearest adjusted LO / RF power, linear over RF frequency in that row, clamped at the ends
+        nearest = self._nearest(query)
+        rows = self.points[nearest][:, [0, 2]]
+        out = np.zeros((len(query), len(corrections)))
+        for row in np.unique(rows, axis=0):
+            queries = np.flatnonzero((rows == row).all(axis=1))
+            points = np.flatnonzero((self.points[:, [0, 2]] == row).all(axis=1))
+            points = points[np.argsort(self.points[points, 3], kind='stable')]
+            for j in range(len(corrections)):
+                out[queries, j] = np.interp(query[queries, 3], self.points[points, 3], self.values[points, j])
+        return out
+
+
+def _key(point):
+    return tuple(round(v, 3) for v in point)
+
+
+def _step(values):
+    steps = np.diff(np.unique(np.round(values, 3)))
+    return float(steps.min()) if len(steps) else 1.0
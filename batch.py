@@ -0,0 +1,123 @@
+import datetime
+import importlib
+import math
+import os
+import shutil
+import time
+
+
+class LocalChamber:
+    # stand-in for a real chamber: first order approach to the setpoint, time_constant in s
+    def __init__(self, temperature=25.0, time_constant=60.0):
+        self._start = temperature
+        self._target = temperature
+        self._since = time.monotonic()
+        self.time_constant = time_constant
+
+    def set(self, temperature):
+        self._start = self.read()
+        self._target = temperature
+        self._since = time.monotonic()
+
+    def read(self):
+        elapsed = time.monotonic() - self._since
+        return self._target + (self._start - self._target) * math.exp(-elapsed / self.time_constant)
+
+    def off(self):
+        pass
+
+
+def make_chamber(driver, **kwargs):
+    # 'local' or 'module:Class' of a driver with set(temperature), read() and off()
+    if not driver:
+        raise RuntimeError("no chamber configured, set 'chamber' in batch.ini to a driver, or to 'local' for a dry run")
+    if driver == 'local':
+        return LocalChamber(**kwargs)
+    module, _, cls = driver.partition(':')
+    return getattr(importlib.import_module(module), cls)(**kwargs)
+
+
+class BatchRunner:
+    def __init__(self, controller, chamber, jobs, tolerance=1.0, soak=300.0, timeout=3 * 3600.0, poll=5.0, path='batch'):
+        self._controller = controller
+        self._chamber = chamber
+        self.jobs = jobs   # [{'profile': '-60', 'temperature': -60.0, 'params': {...}}, ...]
+        self.tolerance = tolerance   # °C
+        self.soak = soak   # s within tolerance before measuring
+        self.timeout = timeout   # s
+        self.poll = poll   # s
+        self.path = path
+
+    def run(self, token):
+        base_params = dict(self._controller.secondaryParams)
+        run_dir = os.path.join(self.path, datetime.datetime.now().isoformat().replace(':', '.'))
+
+        done = list()
+        try:
+            for i, job in enumerate(self.jobs):
+                if token.cancelled:
+                    print('batch cancelled')
+                    break
+
+                profile = job['profile']
+                temperature = job.get('temperature', float(profile))
+                print(f'batch job {i + 1}/{len(self.jobs)}: {profile} at {temperature} °C')
+
+                if not self._wait_temperature(token, temperature):
+                    continue
+
+                self._controller.secondaryParams = {**base_params, **job.get('params', dict())}
+                self._controller.hasResult = False
+                # one job failing on an instrument error must not end the rest of an unattended batch
+                try:
+                    self._controller.measure(token, [profile, None])
+                    if not self._controller.hasResult or token.cancelled:
+                        print(f'batch job {profile} failed')
+                        continue
+
+                    self._save(os.path.join(run_dir, f'{i + 1:02d}_{profile}'))
+                except Exception as ex:
+                    print(f'batch job {profile} failed: {type(ex).__name__}: {ex}')
+                    continue
+                done.append(profile)
+        finally:
+            self._controller.secondaryParams = base_params
+            self._chamber.off()
+
+        print(f'batch finished: {len(done)}/{len(self.jobs)} jobs done {done}')
+        return done
+
+    def _wait_temperature(self, token, temperature):
+        self._chamber.set(temperature)
+
+        started = time.monotonic()
+        settled_since = None
+        while not token.cancelled:
+            now = time.monotonic()
+            current = self._chamber.read()
+
+            if abs(current - temperature) <= self.tolerance:
+                settled_since = settled_since or now
+                if now - settled_since >= self.soak:
+                    return True
+            else:
+                settled_since = None
+
+            if now - started > self.timeout:
+                print(f'chamber did not settle at {temperature} °C, last reading {current:0.1f} °C, skipping job')
+                return False
+
+            time.sleep(self.poll)
+        return False
+
+    def _save(self, job_dir):
+        os.makedirs(job_dir)
+
+        result = self._controller.result
+        result.process()
+        result.export_excel(path=job_dir, show=False)
+
+        for file_name in ('out.txt', 'journal.txt'):
+            if os.path.isfile(file_name):
+                shutil.copy2(file_name, job_dir)
+        print(f'batch job saved to {job_dir}')
@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def child():
+    # runs in a fresh interpreter, so every import is measured cold (apart from the OS file cache)
+    timings = dict()
+
+    start = time.perf_counter()
+    from PyQt5.QtWidgets import QApplication
+    timings['import qt'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from mainwindow import MainWindow
+    timings['import app'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    app = QApplication(sys.argv)
+    timings['qapplication'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    window = MainWindow()
+    timings['construct window'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    window.show()
+    app.processEvents()
+    timings['show window'] = time.perf_counter() - start
+
+    heavy = ['pandas', 'openpyxl', 'pyqtgraph']
+    timings['loaded'] = [name for name in heavy if name in sys.modules]
+
+    print(json.dumps(timings))
+    window.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Program startup time per stage, until the main window is shown')
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child()
+        return
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, __file__, '--child'], cwd=here, check=True,
+                             stdout=subprocess.PIPE, universal_newlines=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f'startup, {args.runs} runs, ms (median / min):')
+    for stage in ['import qt', 'import app', 'qapplication', 'construct window', 'show window']:
+        values = [run[stage] * 1000 for run in runs]
+        print(f'  {stage:<18}{statistics.median(values):8.1f}{min(values):8.1f}')
+    totals = [sum(v for k, v in run.items() if k != 'loaded') * 1000 for run in runs]
+    print(f'  {"total":<18}{statistics.median(totals):8.1f}{min(totals):8.1f}')
+    print('heavy modules loaded at startup:', ', '.join(runs[-1]['loaded']) or 'none')
+
+
+if __name__ == '__main__':
+    main()
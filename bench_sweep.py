@@ -0,0 +1,278 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from forgot_again.file import load_ast_if_exists, pprint_to_file
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# config file overrides on top of the repo's own .ini files, sim.ini is always enabled
+profiles = {
+    # simulated delays are not slept and settling doesn't wait: what is left is Python and the bus layer
+    'ideal': {
+        'sim.ini': {'time_scale': 0.0},
+        'settle.ini': {'min_delay': 0.0, 'poll_interval': 0.0},
+    },
+    # sim.ini latencies in real time with the configured settle delays
+    'gpib': {
+        'sim.ini': {'time_scale': 1.0},
+    },
+    # slow instruments, a busy bus
+    'slow': {
+        'sim.ini': {'time_scale': 1.0, 'latency': {'write': 0.01, 'query': 0.02, 'osc_results': 0.1, 'sweep': 0.2}},
+    },
+}
+
+configs = ['sim.ini', 'settle.ini', 'sweep_params.ini', 'cal_params.ini', 'connect_params.ini']
+
+tasks = ['measure', 'cal-lo', 'cal-rf']
+
+
+class Meter:
+    def __init__(self):
+        self._local = threading.local()
+        self._sleep = time.sleep
+
+        self.io_time = 0.0
+        self.sleep_time = 0.0
+        self.io_by = dict()   # s per instrument
+        self.writes = dict()
+        self.queries = dict()
+
+    def __enter__(self):
+        time.sleep = self._metered_sleep
+        return self
+
+    def __exit__(self, *exc):
+        time.sleep = self._sleep
+
+    @contextlib.contextmanager
+    def io(self, name, counter):
+        counter[name] = counter.get(name, 0) + 1
+        self._local.io = True
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.io_time += elapsed
+            self.io_by[name] = self.io_by.get(name, 0.0) + elapsed
+            self._local.io = False
+
+    def _metered_sleep(self, seconds):
+        # sleeps inside send/query are simulated bus time, the rest is the controller waiting
+        if getattr(self._local, 'io', False):
+            return self._sleep(seconds)
+        start = time.perf_counter()
+        self._sleep(seconds)
+        self.sleep_time += time.perf_counter() - start
+
+
+class MeteredInstrument:
+    def __init__(self, instrument, name, meter):
+        self._instrument = instrument
+        self._name = name
+        self._meter = meter
+
+    def __getattr__(self, item):
+        return getattr(self._instrument, item)
+
+    def send(self, command):
+        with self._meter.io(self._name, self._meter.writes):
+            return self._instrument.send(command)
+
+    def query(self, question):
+        with self._meter.io(self._name, self._meter.queries):
+            return self._instrument.query(question)
+
+
+class MeteredFactory:
+    def __init__(self, factory, name, meter):
+        self._factory = factory
+        self._name = name
+        self._meter = meter
+
+    @property
+    def addr(self):
+        return self._factory.addr
+
+    @addr.setter
+    def addr(self, value):
+        self._factory.addr = value
+
+    def find(self):
+        instrument = self._factory.find()
+        return MeteredInstrument(instrument, self._name, self._meter) if instrument else instrument
+
+
+def run(profile, grid, task, seed):
+    from rigcontroller import RigController, CancelToken
+
+    pows, freqs = grid
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    cwd = os.getcwd()
+    try:
+        _write_configs(workdir, profiles[profile], seed)
+        os.chdir(workdir)
+
+        meter = Meter()
+        controller = RigController()
+        # the session pool keeps the same dict, metered factories are picked up on connect
+        for name, factory in controller.requiredInstruments.items():
+            controller.requiredInstruments[name] = MeteredFactory(factory, name, meter)
+
+        controller.connect({k: v.addr for k, v in controller.requiredInstruments.items()})
+        controller.secondaryParams = _secondary(controller.secondaryParams, pows, freqs)
+        device = next(iter(controller.deviceParams))
+        controller.result.set_secondary_params(controller.secondaryParams)
+        controller.result.set_primary_params(controller.deviceParams[device])
+        controller._init()
+
+        token = CancelToken()
+        meter.io_time = meter.sleep_time = 0.0
+        meter.io_by.clear()
+        meter.writes.clear()
+        meter.queries.clear()
+
+        with meter:
+            start = time.perf_counter()
+            if task == 'measure':
+                controller._clear()
+                controller._measure_s_params(token, controller.deviceParams[device], controller.secondaryParams)
+                points = pows * freqs
+            elif task == 'cal-lo':
+                controller._calibrateLO(token, controller.secondaryParams)
+                points = pows * freqs
+            else:
+                controller._calibrateRF(token, controller.secondaryParams)
+                points = freqs
+            wall = time.perf_counter() - start
+
+        return {
+            'profile': profile,
+            'grid': f'{pows}x{freqs}',
+            'task': task,
+            'points': points,
+            'wall': wall,
+            'points_per_s': points / wall,
+            'io': meter.io_time,
+            'sleep': meter.sleep_time,
+            'python': wall - meter.io_time - meter.sleep_time,
+            'io_by': meter.io_by,
+            'writes': meter.writes,
+            'queries': meter.queries,
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _write_configs(workdir, overrides, seed):
+    for name in configs:
+        data = _merge(load_ast_if_exists(os.path.join(here, name), default={}), overrides.get(name, {}))
+        if name == 'sim.ini':
+            data = _merge(data, {'enabled': True, 'seed': seed})
+        pprint_to_file(os.path.join(workdir, name), data)
+
+
+def _merge(base, override):
+    merged = dict(base)
+    for k, v in override.items():
+        merged[k] = _merge(merged.get(k, {}), v) if isinstance(v, dict) else v
+    return merged
+
+
+def _secondary(secondary, pows, freqs):
+    step = 0.05
+    return {
+        **secondary,
+        'Plo_min': -10.0,
+        'Plo_max': -10.0 + pows - 1,
+        'Plo_delta': 1.0,
+        'Flo_min': 0.1,
+        'Flo_max': round(0.1 + step * (freqs - 1), 3),
+        'Flo_delta': step,
+        'is_Flo_x2': False,
+        'Frf_min': 0.11,
+        'Frf_max': round(0.11 + step * (freqs - 1), 3),
+        'Frf_delta': step,
+    }
+
+
+def _grid(text):
+    pows, _, freqs = text.partition('x')
+    return int(pows), int(freqs)
+
+
+def _print(results):
+    print(f'{"profile":<8}{"grid":>7}{"task":>9}{"points":>8}{"wall, s":>10}{"pts/s":>9}'
+          f'{"writes":>8}{"queries":>9}{"io %":>7}{"sleep %":>9}{"py %":>7}')
+    for r in results:
+        print(f'{r["profile"]:<8}{r["grid"]:>7}{r["task"]:>9}{r["points"]:>8}{r["wall"]:>10.2f}{r["points_per_s"]:>9.2f}'
+              f'{sum(r["writes"].values()):>8}{sum(r["queries"].values()):>9}'
+              f'{r["io"] / r["wall"] * 100:>7.1f}{r["sleep"] / r["wall"] * 100:>9.1f}{r["python"] / r["wall"] * 100:>7.1f}')
+
+
+def _compare(results, baseline_file, tolerance):
+    with open(baseline_file, mode='rt', encoding='utf-8') as f:
+        baseline = {(r['profile'], r['grid'], r['task']): r for r in json.load(f)}
+
+    regressions = 0
+    for r in results:
+        old = baseline.get((r['profile'], r['grid'], r['task']))
+        if not old:
+            continue
+        change = r['points_per_s'] / old['points_per_s'] - 1
+        mark = ''
+        if change < -tolerance:
+            mark = '  <-- regression'
+            regressions += 1
+        print(f'{r["profile"]} {r["grid"]} {r["task"]}: {old["points_per_s"]:0.2f} -> {r["points_per_s"]:0.2f} pts/s '
+              f'({change * 100:+0.1f}%){mark}')
+    return regressions
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Measurement and calibration throughput on the simulated rig')
+    parser.add_argument('-p', '--profile', nargs='+', default=['ideal'], choices=list(profiles))
+    parser.add_argument('-g', '--grid', nargs='+', default=[(1, 10), (3, 30)], type=_grid,
+                        help='LO powers x frequency pairs')
+    parser.add_argument('-t', '--task', nargs='+', default=tasks, choices=tasks)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help='write the results as json')
+    parser.add_argument('--compare', help='json from an earlier --save, fail on slower points/s')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed points/s drop for --compare')
+    parser.add_argument('-v', '--verbose', action='store_true', help='keep the controller output')
+    ns = parser.parse_args(args)
+
+    results = list()
+    for profile in ns.profile:
+        for grid in ns.grid:
+            for task in ns.task:
+                with contextlib.ExitStack() as stack:
+                    if not ns.verbose:
+                        devnull = stack.enter_context(open(os.devnull, mode='wt'))
+                        stack.enter_context(contextlib.redirect_stdout(devnull))
+                    result = run(profile, grid, task, ns.seed)
+                results.append(result)
+                print(f'{profile} {result["grid"]} {task}: {result["wall"]:0.2f} s', file=sys.stderr)
+
+    _print(results)
+
+    if ns.save:
+        with open(ns.save, mode='wt', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+
+    if ns.compare:
+        return 1 if _compare(results, ns.compare, ns.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,38 @@
+import hashlib
+import os
+import time
+
+from forgot_again.file import load_ast_if_exists, pprint_to_file
+
+
+class CalStore:
+    def __init__(self, path='cal', max_age=24 * 3600):
+        self.path = path
+        self.max_age = max_age   # s
+
+    def save(self, kind, key, data):
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        pprint_to_file(self._file_name(kind, key), {
+            'key': key,
+            'timestamp': time.time(),
+            'data': data,
+        })
+
+    def load(self, kind, key):
+        entry = load_ast_if_exists(self._file_name(kind, key), default=None)
+        if not entry or entry['key'] != key:
+            print(f'no {kind} calibration for current instruments and settings')
+            return None
+
+        age = time.time() - entry['timestamp']
+        if age > self.max_age:
+            print(f'{kind} calibration expired: {age / 3600:0.1f} h old')
+            return None
+
+        print(f'reusing {kind} calibration: {age / 3600:0.1f} h old')
+        return entry['data']
+
+    def _file_name(self, kind, key):
+        digest = hashlib.md5(repr(key).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.path, f'{kind}-{digest}.ini')
@@ -0,0 +1,80 @@
+import numpy as np
+
+
+class CalTable:
+    def __init__(self, pows, freqs, losses, by_power=True, kind='linear'):
+        self.pows = np.asarray(pows, dtype=float)   # dBm
+        self.freqs = np.asarray(freqs, dtype=float)   # GHz
+        self.losses = np.asarray(losses, dtype=float).reshape(len(self.pows), len(self.freqs))   # dB
+        self.by_power = by_power
+        self.kind = kind   # 'linear' or 'cubic' (Hermite spline over frequency)
+
+    def __bool__(self):
+        return bool(self.losses.size)
+
+    @classmethod
+    def from_dict(cls, data, kind='linear'):
+        # cal_lo.ini is {pow: {freq: loss}}, cal_rf.ini is {freq: loss}
+        if not data:
+            return cls([], [], [], kind=kind)
+
+        by_power = isinstance(next(iter(data.values())), dict)
+        rows = data if by_power else {0.0: data}
+
+        pows = sorted(rows)
+        freqs = np.array(sorted({f for row in rows.values() for f in row}), dtype=float)
+
+        losses = np.full((len(pows), len(freqs)), np.nan)
+        for i, p in enumerate(pows):
+            for j, f in enumerate(freqs):
+                losses[i, j] = rows[p].get(f, np.nan)
+
+            # rows calibrated on different grids are filled from their own points
+            known = ~np.isnan(losses[i])
+            losses[i] = np.interp(freqs, freqs[known], losses[i][known])
+
+        return cls(pows, freqs, losses, by_power=by_power, kind=kind)
+
+    def to_dict(self):
+        rows = {
+            float(p): {float(f): float(loss) for f, loss in zip(self.freqs, row)}
+            for p, row in zip(self.pows, self.losses)
+        }
+        if self.by_power:
+            return rows
+        return next(iter(rows.values()), dict())
+
+    def lookup(self, power, freq):
+        return float(self.lookup_many([power], [freq])[0])
+
+    def lookup_many(self, powers, freqs):
+        freqs = np.asarray(freqs, dtype=float)
+        powers = np.broadcast_to(np.asarray(powers, dtype=float), freqs.shape)
+
+        if not self:
+            return np.zeros_like(freqs)
+
+        rows = np.array([self._interp_freq(freqs, row) for row in self.losses])
+        if len(self.pows) == 1:
+            return rows[0]
+
+        # linear between the two nearest calibrated powers, clamped at the ends
+        p = np.clip(powers, self.pows[0], self.pows[-1])
+        hi = np.clip(np.searchsorted(self.pows, p), 1, len(self.pows) - 1)
+        lo = hi - 1
+        w = (p - self.pows[lo]) / (self.pows[hi] - self.pows[lo])
+        points = np.arange(len(freqs))
+        return rows[lo, points] * (1 - w) + rows[hi, points] * w
+
+    def _interp_freq(self, x, ys):
+        xs = self.freqs
+        if self.kind != 'cubic' or len(xs) < 3:
+            return np.interp(x, xs, ys)
+
+        x = np.clip(x, xs[0], xs[-1])
+        slopes = np.gradient(ys, xs)
+        i = np.clip(np.searchsorted(xs, x) - 1, 0, len(xs) - 2)
+        h = xs[i + 1] - xs[i]
+        t = (x - xs[i]) / h
+        return (2 * t ** 3 - 3 * t ** 2 + 1) * ys[i] + (t ** 3 - 2 * t ** 2 + t) * h * slopes[i] + \
+            (-2 * t ** 3 + 3 * t ** 2) * ys[i + 1] + (t ** 3 - t ** 2) * h * slopes[i + 1]
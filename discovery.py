@@ -0,0 +1,112 @@
+import inspect
+import queue
+import threading
+import time
+
+from collections import defaultdict
+
+
+def find_all(factories, timeout=5.0, bus_limit=1, on_found=None):
+    # calls find() on every factory at once, returns {name: instrument or None}
+    # instruments on the same GPIB board take turns, bus_limit of them at a time (0 -- no limit),
+    # timeout counts from the moment an instrument gets the bus, the ones behind it keep waiting
+    results = queue.Queue()
+    started = dict()
+    finished = set()
+    abandoned = set()   # timed out, their place on the bus was given to the next instrument
+    guard = threading.Lock()
+    buses = defaultdict(list)
+    for name, factory in factories.items():
+        buses[bus_name(factory.addr)].append(name)
+
+    locks = {
+        bus: threading.BoundedSemaphore(bus_limit) if bus.startswith('GPIB') and bus_limit else None
+        for bus in buses
+    }
+
+    def worker(name, factory, lock):
+        if lock:
+            lock.acquire()
+        with guard:
+            started[name] = time.perf_counter()
+        instrument = None
+        try:
+            instrument = find(factory, timeout)
+        except Exception as ex:
+            print(f'{name}: find error {ex}')
+        with guard:
+            late = name in abandoned
+            if not late:
+                finished.add(name)
+                if lock:
+                    lock.release()
+        if late:
+            # nobody is waiting for it any more, don't leave the session open
+            if instrument:
+                print(f'{name}: answered after the timeout, closing')
+                close(instrument)
+            return
+        results.put((name, instrument))
+
+    for bus, names in buses.items():
+        for name in names:
+            threading.Thread(target=worker, args=(name, factories[name], locks[bus]), daemon=True).start()
+
+    found = dict()
+    pending = set(factories)
+    while pending:
+        try:
+            name, instrument = results.get(timeout=0.05)
+            if name in pending:
+                pending.remove(name)
+                found[name] = instrument
+                _report(on_found, name, instrument, 'нет подключения')
+        except queue.Empty:
+            pass
+
+        now = time.perf_counter()
+        with guard:
+            timed_out = [n for n in pending if n in started and n not in finished and now - started[n] > timeout]
+            for name in timed_out:
+                # a find() the open timeout didn't cut off keeps running, the next instrument gets the bus anyway
+                abandoned.add(name)
+                lock = locks[bus_name(factories[name].addr)]
+                if lock:
+                    lock.release()
+        for name in timed_out:
+            pending.remove(name)
+            found[name] = None
+            _report(on_found, name, None, 'нет ответа')
+
+    return {name: found[name] for name in factories}
+
+
+def find(factory, timeout):
+    # factories that open the VISA resource themselves take the open timeout, ms, the rest can only be waited on
+    if 'open_timeout' in inspect.signature(factory.find).parameters:
+        return factory.find(open_timeout=int(timeout * 1000))
+    return factory.find()
+
+
+def close(instrument):
+    try:
+        instrument.close()
+    except Exception:
+        pass
+
+
+def bus_name(addr):
+    # 'GPIB1::7::INSTR' -> 'GPIB1', every non-GPIB address is a bus of its own
+    board = addr.split('::')[0].upper()
+    if board == 'GPIB':
+        return 'GPIB0'
+    if board.startswith('GPIB'):
+        return board
+    return addr
+
+
+def _report(on_found, name, instrument, missing):
+    status = str(instrument.status) if instrument else missing
+    print(f'{name}: {status}')
+    if on_found:
+        on_found(name, status)
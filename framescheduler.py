@@ -0,0 +1,61 @@
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+
+
+class FrameScheduler(QObject):
+    def __init__(self, draw, fps=20, parent=None):
+        # collects points between frames and draws them together at most fps times a second
+        super().__init__(parent)
+        self._draw = draw
+        self._interval = 1 / fps
+        self._pending = list()
+        self._last = 0.0
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+
+        self.reset()
+
+    def reset(self):
+        self._timer.stop()
+        self._pending.clear()
+        self._started = time.perf_counter()
+
+        self.frames = 0
+        self.points = 0
+        self.draw_time = 0.0   # s on the GUI thread
+        self.max_frame = 0.0
+
+    def push(self, point):
+        self._pending.append(point)
+        if self._timer.isActive():
+            return
+        delay = self._last + self._interval - time.perf_counter()
+        self._timer.start(max(0, int(delay * 1000)))
+
+    def flush(self):
+        self._timer.stop()
+        if not self._pending:
+            return
+
+        points, self._pending = self._pending, list()
+        start = time.perf_counter()
+        self._draw(points)
+        elapsed = time.perf_counter() - start
+        self._last = start
+
+        self.frames += 1
+        self.points += len(points)
+        self.draw_time += elapsed
+        self.max_frame = max(self.max_frame, elapsed)
+
+    @property
+    def report(self):
+        if not self.frames:
+            return 'gui: no frames'
+        wall = time.perf_counter() - self._started
+        return f'gui: {self.frames} frames for {self.points} points, ' \
+               f'{self.draw_time / self.frames * 1000:0.1f} ms mean, {self.max_frame * 1000:0.1f} ms max per frame, ' \
+               f'{self.draw_time / wall * 100:0.1f}% of {wall:0.1f} s'
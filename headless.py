@@ -0,0 +1,69 @@
+import argparse
+import signal
+import sys
+
+from rigcontroller import RigController, CancelToken
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='RF demodulator measurement without GUI')
+    parser.add_argument('action', choices=['check', 'calibrate-lo', 'calibrate-rf', 'measure', 'resume', 'batch'])
+    parser.add_argument('-d', '--device', default='+25', help='report set: +25, -60 or +85')
+    parser.add_argument('--instr', default='instr.ini', help='instrument addresses')
+    parser.add_argument('--params', default='params.ini', help='sweep parameters')
+    ns = parser.parse_args(args)
+
+    # Ctrl+C cancels the run the same way the GUI cancel button does, generators are switched off
+    token = CancelToken()
+    signal.signal(signal.SIGINT, lambda *_: setattr(token, 'cancelled', True))
+
+    controller = RigController(instr_file=ns.instr, params_file=ns.params)
+
+    controller.connect({k: v.addr for k, v in controller.requiredInstruments.items()})
+    if not controller.found:
+        print('connect error, check connection')
+        return 1
+    print(f'connected {controller}')
+
+    params = [ns.device, controller.secondaryParams]
+    controller.check(token, params)
+    if not controller.present:
+        print('sample not found')
+        return 1
+
+    if ns.action == 'check':
+        print(f'calibration required: {controller.calibrationRequired}')
+        return 0
+
+    try:
+        if ns.action == 'calibrate-lo':
+            controller._calibrateLO(token, params)
+            return 0
+        if ns.action == 'calibrate-rf':
+            controller._calibrateRF(token, params)
+            return 0
+    except RuntimeError as ex:
+        print('runtime error:', ex)
+        return 1
+
+    if ns.action == 'measure':
+        controller.measure(token, params)
+    elif ns.action == 'resume':
+        controller.resume(token, params)
+    elif ns.action == 'batch':
+        controller.batch(token, params)
+        return 0 if controller.hasResult else 1
+
+    if not controller.hasResult or token.cancelled:
+        print('error during measurement')
+        return 1
+
+    result = controller.result
+    result.save_adjustment_template()
+    result.process()
+    print(f'saved {result.export_excel(show=False)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -39,4 +39,9 @@ shutil.copytree('./formlayout', './dist/measure/formlayout')
 shutil.copytree('./instr', './dist/measure/instr')
 shutil.copytree('./mytools', './dist/measure/mytools')
 
+# ship the compiled .ui modules, so the first start doesn't have to build them
+import uicache
+uicache.compile_all(srcdir)
+shutil.copytree(uicache.cache_dir, os.path.join(dstdir, uicache.cache_name))
+
 delete_files_starts_with_same_name('api-ms-win','./dist/measure')
\ No newline at end of file
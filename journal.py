@@ -0,0 +1,58 @@
+import ast
+import os
+
+
+class Journal:
+    def __init__(self, path='journal.txt'):
+        self.path = path
+        self._file = None
+
+    def start(self, header):
+        self.close()
+        self._file = open(self.path, mode='wt', encoding='utf-8')
+        self._write(header)
+
+    def resume(self):
+        # rewrite the readable part so a line cut short by a crash doesn't hide the points appended after it
+        # into a temporary file first, a crash during the rewrite must not lose the journal
+        header, entries = self.load()
+        self.close()
+        tmp = f'{self.path}.tmp'
+        with open(tmp, mode='wt', encoding='utf-8') as f:
+            f.writelines(f'{entry!r}\n' for entry in [header, *entries])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._file = open(self.path, mode='at', encoding='utf-8')
+
+    def append(self, key, raw_point, stats):
+        self._write([key, raw_point, stats])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def load(self):
+        if not os.path.isfile(self.path):
+            return None, []
+
+        with open(self.path, mode='rt', encoding='utf-8') as f:
+            lines = f.readlines()
+
+        entries = list()
+        for line in lines:
+            try:
+                entries.append(ast.literal_eval(line))
+            except (ValueError, SyntaxError):
+                # last line is cut short if the run crashed mid-write
+                break
+
+        if not entries:
+            return None, []
+        return entries[0], entries[1:]
+
+    def _write(self, entry):
+        self._file.write(f'{entry!r}\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
@@ -0,0 +1,104 @@
+GHz = 1_000_000_000
+
+
+class SteppedSweep:
+    readback = True   # point_freq() is what the generator reports, not what was commanded
+
+    def __init__(self, gen, freqs, pows):
+        self._gen = gen
+        self._freqs = list(freqs)   # GHz
+        self._pows = list(pows)   # dBm, calibration-corrected
+        self._index = -1
+
+    def start(self):
+        self._index = -1
+
+    def next(self):
+        self._index += 1
+        self._gen.send(f'SOUR:POW {self._pows[self._index]}dbm')
+        self._gen.send(f'SOUR:FREQ {self._freqs[self._index]}GHz')
+
+    def skip(self):
+        self._index += 1
+
+    def point_freq(self):
+        return float(self._gen.query('SOUR:FREQ?'))
+
+    def stop(self):
+        pass
+
+
+class ListSweep(SteppedSweep):
+    # in list mode generators report the CW frequency, the current point is only known from the list
+    readback = False
+
+    def __init__(self, gen, freqs, pows, max_points):
+        super().__init__(gen, freqs, pows)
+        self._max_points = max_points   # longest list the generator takes, longer sweeps are uploaded in parts
+        self._loaded = (0, 0)   # sweep indices of the uploaded part
+
+    def start(self):
+        self._index = -1
+        self._loaded = (0, 0)
+        # the generator moves on its own, cached frequency and power no longer match it
+        _invalidate(self._gen)
+
+        self._gen.send(':SOUR:LIST:TYPE LIST')
+        self._gen.send(':SOUR:LIST:DWEL 0.001')
+
+        # sweep starts right away, every next point waits for a *TRG
+        self._gen.send(':LIST:TRIG:SOUR BUS')
+        self._gen.send(':TRIG:SOUR IMM')
+        self._gen.send(':INIT:CONT OFF')
+
+        self._gen.send(':SOUR:FREQ:MODE LIST')
+        self._gen.send(':SOUR:POW:MODE LIST')
+
+    def next(self):
+        self._index += 1
+        start, stop = self._loaded
+        if start < self._index < stop:
+            self._gen.send('*TRG')
+        else:
+            self._load(self._index)
+
+    def skip(self):
+        # the generator can only move one point per trigger
+        self.next()
+
+    def point_freq(self):
+        return self._freqs[self._index] * GHz
+
+    def stop(self):
+        self._gen.send(':SOUR:FREQ:MODE CW')
+        self._gen.send(':SOUR:POW:MODE FIX')
+        self._gen.send(':INIT:CONT ON')
+        _invalidate(self._gen)
+
+    def _load(self, start):
+        stop = min(start + self._max_points, len(self._freqs))
+        self._gen.send(f':SOUR:LIST:FREQ {",".join(str(round(f * GHz)) for f in self._freqs[start:stop])}')
+        self._gen.send(f':SOUR:LIST:POW {",".join(str(p) for p in self._pows[start:stop])}')
+        self._gen.send(':INIT')
+        self._loaded = (start, stop)
+
+
+def make_sweep(gen, freqs, pows, list_points):
+    # list_points -- list length limit from list_points(), 0 for a point by point sweep
+    if list_points:
+        return ListSweep(gen, freqs, pows, list_points)
+    return SteppedSweep(gen, freqs, pows)
+
+
+def list_points(gen):
+    # longest frequency / power list the generator takes, 0 if it has no list mode
+    try:
+        return max(0, int(float(gen.query(':SOUR:LIST:FREQ:POIN? MAX'))))
+    except Exception:
+        return 0
+
+
+def _invalidate(gen):
+    invalidate = getattr(gen, 'invalidate', None)
+    if invalidate:
+        invalidate()
@@ -4,17 +4,17 @@ import time
 
 from subprocess import Popen
 
-from PyQt5 import uic
 from PyQt5.QtGui import QGuiApplication
 from PyQt5.QtWidgets import QMainWindow
 from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
 
-from formlayout.formlayout import fedit
 from instrumentcontroller import InstrumentController
 from connectionwidget import ConnectionWidget
+from framescheduler import FrameScheduler
 from measurewidget import MeasureWidgetWithSecondaryParameters
 from primaryplotwidget import PrimaryPlotWidget
 from resulttablewidget import ResultTableWidget
+from uicache import load_ui
 
 
 class MainWindow(QMainWindow):
@@ -30,7 +30,7 @@ class MainWindow(QMainWindow):
         self.setAttribute(Qt.WA_DeleteOnClose)
 
         # create instance variables
-        self._ui = uic.loadUi('mainwindow.ui', self)
+        self._ui = load_ui('mainwindow.ui', self)
         self.setWindowTitle('Измерение параметров КД')
 
         self._instrumentController = InstrumentController(parent=self)
@@ -39,6 +39,9 @@ class MainWindow(QMainWindow):
         self._plotWidget = PrimaryPlotWidget(parent=self, controller=self._instrumentController)
         self._tableResultWidget = ResultTableWidget(parent=self, controller=self._instrumentController)
 
+        # points can come in faster than the GUI redraws, show them in batches at a capped frame rate
+        self._frames = FrameScheduler(self._draw_points, fps=20, parent=self)
+
         # init UI
         self._ui.layInstrs.insertWidget(0, self._connectionWidget)
         self._ui.layInstrs.insertWidget(1, self._measureWidget)
@@ -88,6 +91,8 @@ class MainWindow(QMainWindow):
     @pyqtSlot()
     def on_measureComplete(self):
         print('meas complete')
+        self._frames.flush()
+        print(self._frames.report)
         self._plotWidget.plot()
         self._instrumentController.result.save_adjustment_template()
         self._instrumentController.result.process()
@@ -95,10 +100,13 @@ class MainWindow(QMainWindow):
 
     @pyqtSlot()
     def on_measureStarted(self):
+        self._frames.reset()
         self._plotWidget.clear()
 
     @pyqtSlot()
     def on_actParams_triggered(self):
+        from formlayout.formlayout import fedit
+
         data = [
             ('Корректировка', self._instrumentController.result.adjust),
             ('Калибровка', self._instrumentController.cal_set),
@@ -119,10 +127,14 @@ class MainWindow(QMainWindow):
         self._instrumentController.result.only_main_states = only_main_states
         self._plotWidget.only_main_states = only_main_states
 
-    @pyqtSlot()
-    def on_point_ready(self):
+    @pyqtSlot(dict)
+    def on_point_ready(self, point):
+        self._frames.push(point)
+
+    def _draw_points(self, points):
+        # every point goes to the plots, the progress text only needs the latest one
         self._ui.pteditProgress.setPlainText(self._instrumentController.result.report)
-        self._plotWidget.plot()
+        self._plotWidget.extend(points)
 
     def closeEvent(self, _):
         self._instrumentController.saveConfigs()
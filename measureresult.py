@@ -2,15 +2,14 @@ import os
 import datetime
 import random
 
-from collections import defaultdict
-from math import log10, cos, radians
 from subprocess import Popen
 from textwrap import dedent
 
-import openpyxl
-import pandas as pd
+import numpy as np
 
 from forgot_again.file import load_ast_if_exists, pprint_to_file
+from adjusttable import AdjustTable, corrections
+from pointstore import PointStore
 
 KHz = 1_000
 MHz = 1_000_000
@@ -18,20 +17,41 @@ GHz = 1_000_000_000
 mA = 1_000
 mV = 1_000
 
+# raw point as the controller measures it
+fields = ['p_lo', 'f_lo', 'p_rf', 'f_rf', 'u_src', 'i_src', 'ch1_amp', 'ch2_amp', 'phase', 'ch1_freq', 'loss']
+
+# report_columns() in the excel export
+export_headers = [
+    'Pгет, дБм', 'Fгет, ГГц',
+    'Pвх, дБм', 'Fвх, ГГц',
+    'Uпит, В', 'Iпит, мА',
+    'UI, мВ', 'UQ, мВ',
+    'Δφ, º', 'Fосц, ГГц',
+    'Fпч, МГц', 'αош, мВ',
+    'Pпч, дБм', 'Кп, дБм',
+    'αош, раз', 'αош, дБ',
+    'φош, º', 'αзк, дБ',
+    'Потери, дБ',
+]
+
+# derived per point by compute()
+metrics = ['p_pch', 'kp_loss', 'a_err_times', 'a_err_db', 'ph_err', 'a_zk']
+
 
 class MeasureResult:
     def __init__(self):
         self._primary_params = None
         self._secondaryParams = None
-        self._raw = list()
+        # raw fields, derived metrics and the plot x axis of every point in one record array, in sweep grid order
+        self._store = PointStore(fields + metrics + ['f_rf_ghz'])
         self._report = dict()
-        self._processed = list()
+        self._last_index = None
+        self._adjust_table = None
         self.ready = False
 
-        self.data1 = defaultdict(list)
-        self.data2 = defaultdict(list)
-        self.data3 = defaultdict(list)
-        self.data4 = defaultdict(list)
+        self._adjust_params = load_ast_if_exists('adjust_params.ini', default={
+            'match': 'interp',   # off-grid points: 'exact' -- not adjusted, 'nearest' or 'interp' -- by RF frequency
+        })
 
         self.adjustment = load_ast_if_exists('adjust.ini', default=None)
         self._table_header = list()
@@ -44,72 +64,97 @@ class MeasureResult:
         self.ready = True
         self._prepare_table_data()
 
-    def _process_point(self, data):
-        f_lo = data['f_lo'] / GHz
-        f_rf = data['f_rf'] / GHz
-        p_lo = data['p_lo']
-        ui = data['ch1_amp']
-        uq = data['ch2_amp']
-        p_rf = data['p_rf']
-        p_loss = data['loss']
-        phase = data['phase']
-
-        p_pch = 30 + 10 * log10(((ui / 2) ** 2) / 100)
-        kp_loss = p_pch - p_rf + p_loss
-        a_err_times = uq / ui
-        a_err_db = 20 * (log10(uq) - log10(ui))
-        ph_err = phase + 90
-        a_zk = 10 * log10((1 + a_err_times ** 2 + 2 * a_err_times * cos(radians(ph_err))) /
-                          (1 + a_err_times ** 2 - 2 * a_err_times * cos(radians(ph_err))))
-
-        if self.adjustment is not None:
-            try:
-                point = self.adjustment[len(self._processed)]
-                kp_loss += point['kp_loss']
-                a_err_db += point['a_err_db']
-                ph_err += point['ph_err']
-                a_zk += point['a_zk']
-            except LookupError:
-                pass
-
-        self._report = {
-            'p_lo': data['p_lo'],
-            'f_lo': f_lo,
-            'p_rf': p_rf,
-            'f_rf': f_rf,
-            'u_src': round(data['u_src'], 1),
-            'i_src': round(data['i_src'] * mA, 2),
-            'ui': round(data['ch1_amp'] * mV, 1),
-            'uq': round(data['ch2_amp'] * mV, 1),
-            'phase': phase,
-            'freq': round(data['ch1_freq'] / GHz, 3),
-            'f_tune': (data['f_rf'] - data['f_lo']) / MHz,
-            'a_err': round((data['ch1_amp'] - data['ch2_amp']) * mV, 1),
-            'p_pch': round(p_pch, 1),
-            'kp_loss': round(kp_loss, 2),
-            'a_err_times': round(a_err_times, 2),
-            'a_err_db': round(a_err_db, 2),
-            'ph_err': round(ph_err, 2),
-            'a_zk': round(a_zk, 2),
-            'loss': data['loss'],
+    @property
+    def adjustment(self):
+        return self._adjustment
+
+    @adjustment.setter
+    def adjustment(self, value):
+        self._adjustment = value
+        self._adjust_table = adjustment_table(value, self._adjust_params['match'])
+
+    @property
+    def data1(self):
+        return self.curves('kp_loss')
+
+    @property
+    def data2(self):
+        return self.curves('a_err_db')
+
+    @property
+    def data3(self):
+        return self.curves('ph_err')
+
+    @property
+    def data4(self):
+        return self.curves('a_zk')
+
+    def curves(self, metric):
+        # LO power -> (f_rf, metric) views into the store, grid order keeps each LO power contiguous and by frequency
+        p_lo = self._store['p_lo']
+        xs = self._store['f_rf_ghz']
+        ys = self._store[metric]
+        bounds = [0] + (np.flatnonzero(np.diff(p_lo)) + 1).tolist() + [len(p_lo)]
+        return {float(p_lo[a]): (xs[a:b], ys[a:b]) for a, b in zip(bounds, bounds[1:]) if b > a}
+
+    @property
+    def last_point(self):
+        # plotted values of the last added point, sent along with the point ready signal
+        if self._last_index is None:
+            return None
+        point = self._store.records[int(np.searchsorted(self._store['index'], self._last_index))]
+        return {
+            'index': self._last_index,
+            'p_lo': float(point['p_lo']),
+            'f_rf': float(point['f_rf_ghz']),
+            **{k: float(point[k]) for k in corrections},
         }
 
-        self.data1[p_lo].append([f_rf, kp_loss])
-        self.data2[p_lo].append([f_rf, a_err_db])
-        self.data3[p_lo].append([f_rf, ph_err])
-        self.data4[p_lo].append([f_rf, a_zk])
-        self._processed.append({**self._report})
+    def reserve(self, points):
+        self._store.reserve(points)
+
+    def _process_point(self, pos, index):
+        point = self._store.records[pos:pos + 1]
+        derived = compute(point, self._adjust_table)
+        for k, v in derived.items():
+            point[k] = v
+        point['f_rf_ghz'] = point['f_rf'] / GHz
+
+        self._last_index = index
+        self._report = self._row(pos)
+
+    def reprocess(self, loss=None, adjustment=None):
+        # re-apply a new loss and / or adjustment to every measured point in one pass, without re-measuring
+        if loss is not None:
+            self._store['loss'][:] = loss
+        if adjustment is not None:
+            self.adjustment = adjustment
+
+        records = self._store.records
+        for k, v in compute(records, self._adjust_table).items():
+            records[k] = v
+        if self._last_index is not None:
+            self._report = self._row(int(np.searchsorted(records['index'], self._last_index)))
+
+    def raw_points(self):
+        # (grid index, raw point dict as measured) for every stored point
+        records = self._store.records
+        return [(index, dict(zip(fields, values)))
+                for index, *values in zip(records['index'].tolist(), *(records[k].tolist() for k in fields))]
+
+    def _row(self, pos):
+        point = self._store.records[pos:pos + 1]
+        return {k: v[0].item() for k, v in report_columns(point, point).items()}
+
+    def _table(self):
+        records = self._store.records
+        return report_columns(records, records)
 
     def clear(self):
         self._secondaryParams.clear()
-        self._raw.clear()
-        self._report.clear()
-        self._processed.clear()
-
-        self.data1.clear()
-        self.data2.clear()
-        self.data3.clear()
-        self.data4.clear()
+        self._store.clear()
+        self._report = dict()
+        self._last_index = None
 
         self.adjustment = load_ast_if_exists(self._primary_params.get('adjust', ''), default={})
 
@@ -121,23 +166,27 @@ class MeasureResult:
     def set_primary_params(self, params):
         self._primary_params = dict(**params)
 
-    def add_point(self, data):
-        self._raw.append(data)
-        self._process_point(data)
+    def add_point(self, data, index=None):
+        # points may arrive out of order, index is the position in the sweep grid
+        if index is None:
+            index = int(self._store['index'][-1]) + 1 if len(self._store) else 0
+        pos = self._store.insert(index, {k: data[k] for k in fields})
+        self._process_point(pos, index)
 
     def save_adjustment_template(self):
         if not self.adjustment:
             print('measured, saving template')
+            table = self._table()
             self.adjustment = [{
-                'p_lo': p['p_lo'],
-                'f_lo': p['f_lo'],
-                'p_rf': p['p_rf'],
-                'f_rf': p['f_rf'],
+                'p_lo': p_lo,
+                'f_lo': f_lo,
+                'p_rf': p_rf,
+                'f_rf': f_rf,
                 'kp_loss': 0,
                 'a_err_db': 0,
                 'ph_err': 0,
                 'a_zk': 0,
-            } for p in self._processed]
+            } for p_lo, f_lo, p_rf, f_rf in zip(*(table[k].tolist() for k in ['p_lo', 'f_lo', 'p_rf', 'f_rf']))]
         pprint_to_file('adjust.ini', self.adjustment)
 
     @property
@@ -168,30 +217,17 @@ class MeasureResult:
         φош, º={ph_err}
         αзк, дБ={a_zk}""".format(**self._report))
 
-    def export_excel(self):
+    def export_excel(self, path='xlsx', show=True):
         device = 'demod'
-        path = 'xlsx'
         if not os.path.isdir(f'{path}'):
             os.makedirs(f'{path}')
         file_name = f'./{path}/{device}-{datetime.datetime.now().isoformat().replace(":", ".")}.xlsx'
-        df = pd.DataFrame(self._processed)
-
-        df.columns = [
-            'Pгет, дБм', 'Fгет, ГГц',
-            'Pвх, дБм', 'Fвх, ГГц',
-            'Uпит, В', 'Iпит, мА',
-            'UI, мВ', 'UQ, мВ',
-            'Δφ, º', 'Fосц, ГГц',
-            'Fпч, МГц', 'αош, мВ',
-            'Pпч, дБм', 'Кп, дБм',
-            'αош, раз', 'αош, дБ',
-            'φош, º', 'αзк, дБ',
-            'Потери, дБ',
-        ]
-        df.to_excel(file_name, engine='openpyxl', index=False)
+        write_excel(file_name, self._table())
 
         full_path = os.path.abspath(file_name)
-        Popen(f'explorer /select,"{full_path}"')
+        if show:
+            Popen(f'explorer /select,"{full_path}"')
+        return full_path
 
     def _prepare_table_data(self):
         table_file = self._primary_params.get('result', '')
@@ -199,6 +235,8 @@ class MeasureResult:
         if not os.path.isfile(table_file):
             return
 
+        import openpyxl
+
         wb = openpyxl.load_workbook(table_file)
         ws = wb.active
 
@@ -226,3 +264,93 @@ class MeasureResult:
 
     def get_result_table_data(self):
         return list(self._table_header), list(self._table_data)
+
+
+def compute(raw, adjust_table=None):
+    # derived metrics for whole columns of raw points
+    ui = raw['ch1_amp']
+    uq = raw['ch2_amp']
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p_pch = 30 + 10 * np.log10(((ui / 2) ** 2) / 100)
+        kp_loss = p_pch - raw['p_rf'] + raw['loss']
+        a_err_times = uq / ui
+        a_err_db = 20 * (np.log10(uq) - np.log10(ui))
+        ph_err = raw['phase'] + 90
+        cos_ph = np.cos(np.radians(ph_err))
+        a_zk = 10 * np.log10((1 + a_err_times ** 2 + 2 * a_err_times * cos_ph) /
+                             (1 + a_err_times ** 2 - 2 * a_err_times * cos_ph))
+
+    if adjust_table:
+        adjust = adjust_table.lookup_many(raw['p_lo'], raw['f_lo'] / GHz, raw['p_rf'], raw['f_rf'] / GHz)
+        kp_loss = kp_loss + adjust[:, 0]
+        a_err_db = a_err_db + adjust[:, 1]
+        ph_err = ph_err + adjust[:, 2]
+        a_zk = a_zk + adjust[:, 3]
+
+    return {
+        'p_pch': p_pch,
+        'kp_loss': kp_loss,
+        'a_err_times': a_err_times,
+        'a_err_db': a_err_db,
+        'ph_err': ph_err,
+        'a_zk': a_zk,
+    }
+
+
+def report_columns(raw, derived):
+    # columns of the report and the excel export, rounded for display
+    return {
+        'p_lo': raw['p_lo'],
+        'f_lo': raw['f_lo'] / GHz,
+        'p_rf': raw['p_rf'],
+        'f_rf': raw['f_rf'] / GHz,
+        'u_src': np.round(raw['u_src'], 1),
+        'i_src': np.round(raw['i_src'] * mA, 2),
+        'ui': np.round(raw['ch1_amp'] * mV, 1),
+        'uq': np.round(raw['ch2_amp'] * mV, 1),
+        'phase': raw['phase'],
+        'freq': np.round(raw['ch1_freq'] / GHz, 3),
+        'f_tune': (raw['f_rf'] - raw['f_lo']) / MHz,
+        'a_err': np.round((raw['ch1_amp'] - raw['ch2_amp']) * mV, 1),
+        'p_pch': np.round(derived['p_pch'], 1),
+        'kp_loss': np.round(derived['kp_loss'], 2),
+        'a_err_times': np.round(derived['a_err_times'], 2),
+        'a_err_db': np.round(derived['a_err_db'], 2),
+        'ph_err': np.round(derived['ph_err'], 2),
+        'a_zk': np.round(derived['a_zk'], 2),
+        'loss': raw['loss'],
+    }
+
+
+def raw_columns(points):
+    # list of raw point dicts -> one array per raw field
+    return {k: np.array([p[k] for p in points], dtype=float).reshape(-1) for k in fields}
+
+
+def write_excel(file_name, table):
+    # pandas takes longer to import than the rest of the app, load it on first export
+    import pandas as pd
+
+    df = pd.DataFrame(table)
+    df.columns = export_headers
+    df.to_excel(file_name, engine='openpyxl', index=False)
+
+
+def write_text(file_name, table):
+    # tab separated, same columns as the excel export
+    with open(file_name, mode='wt', encoding='utf-8') as f:
+        f.write('\t'.join(export_headers) + '\n')
+        for row in zip(*(v.tolist() for v in table.values())):
+            f.write('\t'.join(str(v) for v in row) + '\n')
+
+
+def adjustment_table(adjustment, match='interp'):
+    # adjustment file -> corrections keyed by (p_lo, f_lo, p_rf, f_rf), independent of the grid and point order
+    if not adjustment:
+        return None
+    try:
+        return AdjustTable.from_list(adjustment, match=match)
+    except (LookupError, TypeError, ValueError):
+        print('adjustment file format error, not applied')
+        return None
@@ -1,8 +1,9 @@
-from PyQt5 import uic
 from PyQt5.QtCore import pyqtSlot, pyqtSignal, QRunnable, QThreadPool, QTimer
 from PyQt5.QtWidgets import QWidget, QDoubleSpinBox, QCheckBox
 
 from deviceselectwidget import DeviceSelectWidget
+from uicache import load_ui
+from rigcontroller import CancelToken
 from forgot_again.file import remove_if_exists
 
 
@@ -21,11 +22,6 @@ class MeasureTask(QRunnable):
         self.end()
 
 
-class CancelToken:
-    def __init__(self):
-        self.cancelled = False
-
-
 class MeasureWidget(QWidget):
 
     selectedChanged = pyqtSignal(str)
@@ -37,7 +33,7 @@ class MeasureWidget(QWidget):
     def __init__(self, parent=None, controller=None):
         super().__init__(parent=parent)
 
-        self._ui = uic.loadUi('measurewidget.ui', self)
+        self._ui = load_ui('measurewidget.ui', self)
         self._controller = controller
         self._threads = QThreadPool()
 
@@ -79,6 +75,20 @@ class MeasureWidget(QWidget):
                                         self.measureTaskComplete,
                                         self._selectedDevice))
 
+    def resume(self):
+        print('resuming...')
+        self._modeDuringMeasure()
+        self._threads.start(MeasureTask(self._controller.resume,
+                                        self.measureTaskComplete,
+                                        self._selectedDevice))
+
+    def batch(self):
+        print('running batch...')
+        self._modeDuringMeasure()
+        self._threads.start(MeasureTask(self._controller.batch,
+                                        self.measureTaskComplete,
+                                        self._selectedDevice))
+
     def cancel(self):
         pass
 
@@ -116,6 +126,18 @@ class MeasureWidget(QWidget):
         self.measureStarted.emit()
         self.measure()
 
+    @pyqtSlot()
+    def on_btnResume_clicked(self):
+        print('resume measure')
+        self.measureStarted.emit()
+        self.resume()
+
+    @pyqtSlot()
+    def on_btnBatch_clicked(self):
+        print('start batch')
+        self.measureStarted.emit()
+        self.batch()
+
     @pyqtSlot()
     def on_btnCancel_clicked(self):
         print('cancel click')
@@ -133,6 +155,8 @@ class MeasureWidget(QWidget):
     def _modePreConnect(self):
         self._ui.btnCheck.setEnabled(False)
         self._ui.btnMeasure.setEnabled(False)
+        self._ui.btnResume.setEnabled(False)
+        self._ui.btnBatch.setEnabled(False)
         self._ui.btnCancel.setEnabled(False)
         self._ui.btnCalibrateLO.setEnabled(False)
         self._ui.btnCalibrateRf.setEnabled(False)
@@ -141,6 +165,8 @@ class MeasureWidget(QWidget):
     def _modePreCheck(self):
         self._ui.btnCheck.setEnabled(True)
         self._ui.btnMeasure.setEnabled(False)
+        self._ui.btnResume.setEnabled(False)
+        self._ui.btnBatch.setEnabled(False)
         self._ui.btnCancel.setEnabled(False)
         self._ui.btnCalibrateLO.setEnabled(False)
         self._ui.btnCalibrateRF.setEnabled(False)
@@ -149,6 +175,8 @@ class MeasureWidget(QWidget):
     def _modeDuringCheck(self):
         self._ui.btnCheck.setEnabled(False)
         self._ui.btnMeasure.setEnabled(False)
+        self._ui.btnResume.setEnabled(False)
+        self._ui.btnBatch.setEnabled(False)
         self._ui.btnCancel.setEnabled(False)
         self._ui.btnCalibrateLO.setEnabled(False)
         self._ui.btnCalibrateRF.setEnabled(False)
@@ -157,6 +185,8 @@ class MeasureWidget(QWidget):
     def _modePreMeasure(self):
         self._ui.btnCheck.setEnabled(False)
         self._ui.btnMeasure.setEnabled(True)
+        self._ui.btnResume.setEnabled(True)
+        self._ui.btnBatch.setEnabled(True)
         self._ui.btnCancel.setEnabled(False)
         self._ui.btnCalibrateLO.setEnabled(True)
         self._ui.btnCalibrateRF.setEnabled(True)
@@ -165,6 +195,8 @@ class MeasureWidget(QWidget):
     def _modeDuringMeasure(self):
         self._ui.btnCheck.setEnabled(False)
         self._ui.btnMeasure.setEnabled(False)
+        self._ui.btnResume.setEnabled(False)
+        self._ui.btnBatch.setEnabled(False)
         self._ui.btnCancel.setEnabled(True)
         self._ui.btnCalibrateLO.setEnabled(False)
         self._ui.btnCalibrateRF.setEnabled(False)
@@ -366,6 +398,7 @@ class MeasureWidgetWithSecondaryParameters(MeasureWidget):
         res = super(MeasureWidgetWithSecondaryParameters, self).checkTaskComplete()
         if not res:
             self._token = CancelToken()
+        self._markCalibrationRequired()
         return res
 
     def calibrate(self, what):
@@ -382,8 +415,16 @@ class MeasureWidgetWithSecondaryParameters(MeasureWidget):
     def calibrateTaskComplete(self):
         print('calibrate finished')
         self._modePreMeasure()
+        self._markCalibrationRequired()
         self.calibrateFinished.emit()
 
+    def _markCalibrationRequired(self):
+        required = self._controller.calibrationRequired
+        if required:
+            print(f'calibration required: {required}')
+        self._ui.btnCalibrateLO.setStyleSheet('color: red' if 'LO' in required else '')
+        self._ui.btnCalibrateRF.setStyleSheet('color: red' if 'RF' in required else '')
+
     def measure(self):
         print('subclass measuring...')
         self._modeDuringMeasure()
@@ -395,6 +436,28 @@ class MeasureWidgetWithSecondaryParameters(MeasureWidget):
                 [self._selectedDevice, self._params]
             ))
 
+    def resume(self):
+        print('subclass resuming...')
+        self._modeDuringMeasure()
+        self._threads.start(
+            MeasureTask(
+                self._controller.resume,
+                self.measureTaskComplete,
+                self._token,
+                [self._selectedDevice, self._params]
+            ))
+
+    def batch(self):
+        print('subclass running batch...')
+        self._modeDuringMeasure()
+        self._threads.start(
+            MeasureTask(
+                self._controller.batch,
+                self.measureTaskComplete,
+                self._token,
+                [self._selectedDevice, self._params]
+            ))
+
     def measureTaskComplete(self):
         res = super(MeasureWidgetWithSecondaryParameters, self).measureTaskComplete()
         if not res:
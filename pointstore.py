@@ -0,0 +1,52 @@
+import numpy as np
+
+
+class PointStore:
+    def __init__(self, fields, capacity=0):
+        # one typed record per point, kept sorted by sweep grid index,
+        # column views stay valid until the next insert that has to grow the store
+        self._dtype = np.dtype([('index', np.int64)] + [(f, np.float64) for f in fields])
+        self._data = np.zeros(capacity, dtype=self._dtype)
+        self._size = 0
+        self.grown = 0
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, field):
+        return self._data[field][:self._size]
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    @property
+    def records(self):
+        return self._data[:self._size]
+
+    def reserve(self, capacity):
+        if capacity <= len(self._data):
+            return
+        data = np.zeros(capacity, dtype=self._dtype)
+        data[:self._size] = self._data[:self._size]
+        self._data = data
+
+    def clear(self):
+        self._size = 0
+
+    def insert(self, index, values):
+        # returns the point's position, points measured out of grid order shift the tail in place
+        if self._size == len(self._data):
+            self.reserve(max(64, len(self._data) * 2))
+            self.grown += 1
+
+        pos = int(np.searchsorted(self._data['index'][:self._size], index))
+        if pos < self._size:
+            self._data[pos + 1:self._size + 1] = self._data[pos:self._size]
+
+        self._data[pos] = 0
+        self._data['index'][pos] = index
+        for k, v in values.items():
+            self._data[k][pos] = v
+        self._size += 1
+        return pos
@@ -1,12 +1,15 @@
-import pyqtgraph as pg
+import numpy as np
 
 from PyQt5.QtWidgets import QGridLayout, QWidget, QLabel
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 
 
 # https://www.learnpyqt.com/tutorials/plotting-pyqtgraph/
 # https://pyqtgraph.readthedocs.io/en/latest/introduction.html#what-is-pyqtgraph
 
+# plotted metric of each plot: top left, top right, bottom left, bottom right
+metrics = ['kp_loss', 'a_err_db', 'ph_err', 'a_zk']
+
 colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf',
           '#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
 
@@ -22,13 +25,39 @@ class PrimaryPlotWidget(QWidget):
 
         self._grid = QGridLayout()
 
-        self._win = pg.GraphicsLayoutWidget(show=True)
-        self._win.setBackground('w')
-
         self._stat_label = QLabel('Mouse:')
         self._stat_label.setAlignment(Qt.AlignRight)
 
         self._grid.addWidget(self._stat_label, 0, 0)
+
+        self._curves_00 = dict()
+        self._curves_01 = dict()
+        self._curves_10 = dict()
+        self._curves_11 = dict()
+
+        # LO power -> points plotted so far, sorted by frequency
+        self._buffers = dict()
+        self._indices = set()   # grid indices of the plotted points
+
+        self._win = None
+
+        self.setLayout(self._grid)
+
+    def showEvent(self, event):
+        # let the main window paint first, then bring up the plots
+        QTimer.singleShot(0, self._init_plots)
+        super().showEvent(event)
+
+    def _init_plots(self):
+        # pyqtgraph is slow to import, build the plots when they are first needed
+        if self._win is not None:
+            return
+
+        import pyqtgraph as pg
+
+        self._win = pg.GraphicsLayoutWidget(show=True)
+        self._win.setBackground('w')
+
         self._grid.addWidget(self._win, 1, 0)
 
         self._plot_00 = self._win.addPlot(row=1, col=0)
@@ -43,11 +72,6 @@ class PrimaryPlotWidget(QWidget):
         self._plot_11 = self._win.addPlot(row=2, col=1)
         # self._plot_11.setTitle('αзк')
 
-        self._curves_00 = dict()
-        self._curves_01 = dict()
-        self._curves_10 = dict()
-        self._curves_11 = dict()
-
         self._plot_00.setLabel('left', 'Кп', **self.label_style)
         self._plot_00.setLabel('bottom', 'Fвх, ГГц', **self.label_style)
         # self._plot_00.setXRange(0, 11, padding=0)
@@ -108,8 +132,6 @@ class PrimaryPlotWidget(QWidget):
         self._plot_11.addItem(self._hLine_11, ignoreBounds=True)
         self._proxy_11 = pg.SignalProxy(self._plot_11.scene().sigMouseMoved, rateLimit=60, slot=self.mouseMoved_11)
 
-        self.setLayout(self._grid)
-
     def mouseMoved_00(self, event):
         pos = event[0]
         if self._plot_00.sceneBoundingRect().contains(pos):
@@ -175,6 +197,11 @@ class PrimaryPlotWidget(QWidget):
             ]))
 
     def clear(self):
+        self._buffers.clear()
+        self._indices.clear()
+        if self._win is None:
+            return
+
         def _remove_curves(plot, curve_dict):
             for _, curve in curve_dict.items():
                 plot.removeItem(curve)
@@ -189,37 +216,120 @@ class PrimaryPlotWidget(QWidget):
         self._curves_10.clear()
         self._curves_11.clear()
 
+    def append(self, point):
+        self.extend([point])
+
+    def extend(self, points):
+        # new points from the point ready signal, only the curves they belong to are updated, once per call
+        self._init_plots()
+        changed = dict()
+        for point in points:
+            if point['index'] in self._indices:
+                # the grid started over without a measure started signal, e.g. the next batch job
+                self.clear()
+                changed.clear()
+            self._indices.add(point['index'])
+
+            pow_lo = point['p_lo']
+            if pow_lo not in self._buffers:
+                self._buffers[pow_lo] = CurveBuffer(len(metrics))
+            self._buffers[pow_lo].insert(point['f_rf'], [point[k] for k in metrics])
+            changed[pow_lo] = self._buffers[pow_lo]
+        for pow_lo, buffer in changed.items():
+            self._plot_buffer(pow_lo, buffer)
+
     def plot(self):
+        # redraw everything from the result, new points come in through append()
         print('plotting primary stats')
-        _plot_curves(self._controller.result.data1, self._curves_00, self._plot_00, prefix='Pгет= ', suffix=' дБм')
-        _plot_curves(self._controller.result.data2, self._curves_01, self._plot_01, prefix='Pгет= ', suffix=' дБм')
-        _plot_curves(self._controller.result.data3, self._curves_10, self._plot_10, prefix='Pгет= ', suffix=' дБм')
-        _plot_curves(self._controller.result.data4, self._curves_11, self._plot_11, prefix='Pгет= ', suffix=' дБм')
-
-
-def _plot_curves(datas, curves, plot, prefix='', suffix=''):
-    for pow_lo, data in datas.items():
-        curve_xs, curve_ys = zip(*data)
-        try:
-            curves[pow_lo].setData(x=curve_xs, y=curve_ys)
-        except KeyError:
-            try:
-                color = colors[len(curves)]
-            except IndexError:
-                color = colors[len(curves) - len(colors)]
-            curves[pow_lo] = pg.PlotDataItem(
-                curve_xs,
-                curve_ys,
-                pen=pg.mkPen(
-                    color=color,
-                    width=2,
-                ),
-                symbol='o',
-                symbolSize=5,
-                symbolBrush=color,
-                name=f'{prefix}{pow_lo}{suffix}'
-            )
-            plot.addItem(curves[pow_lo])
+        self._init_plots()
+        self._buffers.clear()
+        self._indices = {index for index, _ in self._controller.result.raw_points()}
+        for k, metric in enumerate(metrics):
+            for pow_lo, (xs, ys) in self._controller.result.curves(metric).items():
+                if pow_lo not in self._buffers:
+                    self._buffers[pow_lo] = CurveBuffer(len(metrics), capacity=len(xs))
+                self._buffers[pow_lo].load(k, xs, ys)
+        for pow_lo, buffer in self._buffers.items():
+            self._plot_buffer(pow_lo, buffer)
+
+    def _plot_buffer(self, pow_lo, buffer):
+        plots = [
+            (self._curves_00, self._plot_00),
+            (self._curves_01, self._plot_01),
+            (self._curves_10, self._plot_10),
+            (self._curves_11, self._plot_11),
+        ]
+        for k, (curves, plot) in enumerate(plots):
+            _plot_curve(curves, plot, pow_lo, buffer.xs, buffer.ys[k], prefix='Pгет= ', suffix=' дБм')
+
+
+class CurveBuffer:
+    def __init__(self, columns, capacity=256):
+        # preallocated x and y values of one LO power, grown by doubling, views are handed to the plot items
+        self._xs = np.empty(max(1, capacity))
+        self._ys = np.empty((columns, max(1, capacity)))
+        self.size = 0
+
+    @property
+    def xs(self):
+        return self._xs[:self.size]
+
+    @property
+    def ys(self):
+        return self._ys[:, :self.size]
+
+    def insert(self, x, ys):
+        if self.size == len(self._xs):
+            self._grow(len(self._xs) * 2)
+        # appending at the end is cheap, anywhere else shifts the tail -- a downward sweep moves the whole buffer
+        pos = int(np.searchsorted(self._xs[:self.size], x, side='right'))
+        if pos < self.size:
+            self._xs[pos + 1:self.size + 1] = self._xs[pos:self.size]
+            self._ys[:, pos + 1:self.size + 1] = self._ys[:, pos:self.size]
+        self._xs[pos] = x
+        self._ys[:, pos] = ys
+        self.size += 1
+
+    def load(self, column, xs, ys):
+        if len(xs) > len(self._xs):
+            self._grow(len(xs))
+        self.size = len(xs)
+        self._xs[:self.size] = xs
+        self._ys[column, :self.size] = ys
+
+    def _grow(self, capacity):
+        xs = np.empty(capacity)
+        ys = np.empty((len(self._ys), capacity))
+        xs[:self.size] = self._xs[:self.size]
+        ys[:, :self.size] = self._ys[:, :self.size]
+        self._xs = xs
+        self._ys = ys
+
+
+def _plot_curve(curves, plot, pow_lo, curve_xs, curve_ys, prefix='', suffix=''):
+    import pyqtgraph as pg
+
+    if pow_lo in curves:
+        curves[pow_lo].setData(x=curve_xs, y=curve_ys)
+        return
+
+    try:
+        color = colors[len(curves)]
+    except IndexError:
+        color = colors[len(curves) - len(colors)]
+    curves[pow_lo] = pg.PlotDataItem(
+        curve_xs,
+        curve_ys,
+        pen=pg.mkPen(
+            color=color,
+            width=2,
+        ),
+        symbol='o',
+        symbolSize=5,
+        symbolBrush=color,
+        name=f'{prefix}{pow_lo}{suffix}'
+    )
+    plot.addItem(curves[pow_lo])
 
 
 def _label_text(x, y, vals):
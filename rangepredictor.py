@@ -0,0 +1,74 @@
+class RangePredictor:
+    def __init__(self, margin=2.2, lo_slope=0.5, max_ratio=2.0):
+        self.margin = margin   # range / expected amplitude, same headroom the autoscale loop aims for
+        self.lo_slope = lo_slope   # dB of IF amplitude per dB of LO power
+        self.max_ratio = max_ratio   # limit on the extrapolated change between adjacent points
+
+        self._rows = dict()
+        self._last = None
+        self._prev = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def reset(self):
+        self._rows.clear()
+        self._last = None
+        self._prev = None
+        self.hits = 0
+        self.misses = 0
+
+    def predict(self, pow_lo, freq):
+        if self._last is None:
+            return None
+
+        last_pow, last_freq, last_amp = self._last
+
+        if pow_lo != last_pow:
+            # new LO power row: start from the same frequency in the previous row
+            base = self._rows[last_pow].get(freq, last_amp)
+            amp = base * 10 ** ((pow_lo - last_pow) * self.lo_slope / 20)
+        elif self._prev is not None and self._prev[0] == pow_lo and self._prev[1] != last_freq:
+            _, prev_freq, prev_amp = self._prev
+            slope = (last_amp - prev_amp) / (last_freq - prev_freq)
+            amp = last_amp + slope * (freq - last_freq)
+            amp = min(max(amp, last_amp / self.max_ratio), last_amp * self.max_ratio)
+        else:
+            amp = last_amp
+
+        return amp * self.margin
+
+    def expected_amp(self, pow_lo, freq):
+        # measured amplitude of the point, or the same frequency in the nearest measured LO power row
+        rows = [p for p, row in self._rows.items() if freq in row]
+        if not rows:
+            return None
+        nearest = min(rows, key=lambda p: abs(p - pow_lo))
+        return self._rows[nearest][freq] * 10 ** ((pow_lo - nearest) * self.lo_slope / 20)
+
+    def seed(self, pow_lo, freq, ch1_amp, ch2_amp):
+        # amplitude known before the sweep (a resumed point), doesn't count as the last measured one
+        amp = max(ch1_amp, ch2_amp)
+        if not 0 < amp < 1_000_000:
+            return None
+        self._rows.setdefault(pow_lo, dict())[freq] = amp
+        return amp
+
+    def update(self, pow_lo, freq, ch1_amp, ch2_amp):
+        amp = self.seed(pow_lo, freq, ch1_amp, ch2_amp)
+        if amp is None:
+            return
+        self._prev = self._last
+        self._last = pow_lo, freq, amp
+
+    def record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    @property
+    def report(self):
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        return f'range prediction: {self.hits}/{total} hits ({rate:0.0f}%)'
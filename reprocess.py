@@ -0,0 +1,141 @@
+import argparse
+import ast
+import os
+import sys
+import time
+
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from journal import Journal
+from measureresult import compute, report_columns, raw_columns, adjustment_table, write_excel, write_text
+from forgot_again.file import load_ast_if_exists
+
+# archived raw points: out.txt of a finished run, journal.txt of a cancelled or crashed one
+archives = ['out.txt', 'journal.txt']
+
+
+def load_points(file_name):
+    # raw point dicts in canonical grid order
+    if os.path.basename(file_name) == 'journal.txt':
+        _, entries = Journal(file_name).load()
+        return [raw_point for _, raw_point, _ in sorted(entries, key=lambda entry: entry[0])]
+
+    with open(file_name, mode='rt', encoding='utf-8') as f:
+        return [raw_point for raw_point, _ in ast.literal_eval(f.read())]
+
+
+def find_archives(paths):
+    # archive files under the given files / directories, a directory with out.txt doesn't need its journal
+    found = list()
+    for path in paths:
+        if os.path.isfile(path):
+            found.append(path)
+            continue
+        for root, _, files in os.walk(path):
+            names = [n for n in archives if n in files]
+            if names:
+                found.append(os.path.join(root, names[0]))
+    # the same run given twice, e.g. a file inside a given directory
+    unique = dict()
+    for path in found:
+        unique.setdefault(os.path.abspath(path), path)
+    return list(unique.values())
+
+
+def common_root(paths):
+    # outputs keep the layout below the deepest directory holding all the given paths,
+    # runs/*/out.txt -> reprocessed/<run>/demod-out.xlsx rather than one file for all of them
+    dirs = [os.path.abspath(p if os.path.isdir(p) else os.path.dirname(p) or '.') for p in paths]
+    return os.path.commonpath(dirs)
+
+
+def reprocess(job):
+    # runs in a worker process: one archive in, one export out
+    src, dst, loss, adjustment, match, fmt = job
+    start = time.perf_counter()
+    try:
+        points = load_points(src)
+        if not points:
+            return src, None, 0, 'no points'
+
+        raw = raw_columns(points)
+        if loss is not None:
+            raw['loss'][:] = loss
+        table = report_columns(raw, compute(raw, adjustment_table(adjustment, match)))
+
+        os.makedirs(os.path.dirname(dst) or '.', exist_ok=True)
+        if fmt == 'xlsx':
+            write_excel(dst, table)
+        else:
+            write_text(dst, table)
+        return src, dst, len(points), f'{time.perf_counter() - start:0.2f} s'
+    except Exception as ex:
+        return src, None, 0, f'error: {ex}'
+
+
+def _destination(src, root, out, fmt):
+    # out/<archive dir relative to the common root>/demod-<archive name>.<fmt>
+    rel = os.path.relpath(os.path.dirname(os.path.abspath(src)), os.path.abspath(root))
+    stem = os.path.splitext(os.path.basename(src))[0]
+    return os.path.normpath(os.path.join(out, rel, f'demod-{stem}.{fmt}'))
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Recompute derived tables of archived runs with new loss / adjustment')
+    parser.add_argument('paths', nargs='+', help='out.txt / journal.txt files or directories to search')
+    parser.add_argument('-o', '--out', default='reprocessed', help='output directory')
+    parser.add_argument('--loss', type=float, help='dB, replaces the loss the runs were measured with')
+    parser.add_argument('--adjust', help='adjustment file, without it no adjustment is applied')
+    parser.add_argument('--match', choices=['exact', 'nearest', 'interp'], default='interp',
+                        help='adjustment match for off-grid points')
+    parser.add_argument('-f', '--format', choices=['xlsx', 'txt'], default='xlsx')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='worker processes')
+    ns = parser.parse_args(args)
+
+    adjustment = load_ast_if_exists(ns.adjust, default=None) if ns.adjust else None
+    if ns.adjust and not adjustment:
+        print(f'adjustment file {ns.adjust} not found')
+        return 1
+
+    found = find_archives(ns.paths)
+    if not found:
+        print('no archived runs found')
+        return 1
+
+    root = common_root(ns.paths)
+    jobs = [(src, _destination(src, root, ns.out, ns.format), ns.loss, adjustment, ns.match, ns.format)
+            for src in found]
+
+    # workers writing the same file would overwrite each other
+    sources = defaultdict(list)
+    for src, dst, *_ in jobs:
+        sources[dst].append(src)
+    clashes = {dst: srcs for dst, srcs in sources.items() if len(srcs) > 1}
+    for dst, srcs in clashes.items():
+        print(f'{dst}: same output for {", ".join(srcs)}')
+    if clashes:
+        return 1
+
+    start = time.perf_counter()
+    errors = 0
+    points = 0
+    with ProcessPoolExecutor(max_workers=max(1, ns.jobs)) as pool:
+        # a few archives per task, one run is too small a unit to send to a process on its own
+        chunksize = int(np.clip(len(jobs) // (max(1, ns.jobs) * 4), 1, 16))
+        for src, dst, count, note in pool.map(reprocess, jobs, chunksize=chunksize):
+            if dst is None:
+                errors += 1
+                print(f'{src}: {note}')
+            else:
+                points += count
+                print(f'{src} -> {dst}: {count} points, {note}')
+
+    print(f'{len(jobs) - errors}/{len(jobs)} runs, {points} points in {time.perf_counter() - start:0.1f} s')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
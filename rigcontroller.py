@@ -0,0 +1,928 @@
+import time
+
+import numpy as np
+
+from collections import defaultdict
+
+from instr.instrumentfactory import mock_enabled, OscilloscopeFactory, GeneratorFactory, SourceFactory, \
+    MultimeterFactory, AnalyzerFactory
+from batch import BatchRunner, make_chamber
+from calstore import CalStore
+from caltable import CalTable
+from measureresult import MeasureResult
+from journal import Journal
+from listsweep import make_sweep, list_points
+from rangepredictor import RangePredictor
+from scpitrace import ScpiTrace, TracedInstrument
+from sessionpool import SessionPool
+from settle import Settler
+from simrig import make_factories
+from sweeporder import CostModel, plan_order
+from sweepplan import SweepPlan
+from statecache import CachedInstrument
+from tracecal import TraceCalibrator
+from waveform import WaveformCapture
+from forgot_again.file import load_ast_if_exists, pprint_to_file
+
+
+class CancelToken:
+    def __init__(self):
+        self.cancelled = False
+
+
+class RigController:
+    # measurement logic without Qt, InstrumentController adds the signals for the GUI
+
+    def __init__(self, instr_file='instr.ini', params_file='params.ini', **kwargs):
+        super().__init__(**kwargs)
+
+        self._params_file = params_file
+
+        addrs = load_ast_if_exists(instr_file, default={
+            'Осциллограф': 'GPIB1::7::INSTR',
+            'Анализатор': 'GPIB1::18::INSTR',
+            'P LO': 'GPIB1::6::INSTR',
+            'P RF': 'GPIB1::20::INSTR',
+            'Источник': 'GPIB1::3::INSTR',
+            'Мультиметр': 'GPIB1::22::INSTR',
+        })
+
+        sim = load_ast_if_exists('sim.ini', default={
+            'enabled': False,
+            'time_scale': 1.0,   # 0 -- simulated delays are not slept, as fast as the controller goes
+            'seed': None,
+        })
+        clock = None
+        if sim['enabled'] or mock_enabled:
+            # simulated rig in place of the instruments, the old mock switch turns it on as well
+            self.requiredInstruments = make_factories(addrs, **{k: v for k, v in sim.items() if k != 'enabled'})
+            clock = self.requiredInstruments['Осциллограф'].clock
+        else:
+            self.requiredInstruments = {
+                'Осциллограф': OscilloscopeFactory(addrs['Осциллограф']),
+                'Анализатор': AnalyzerFactory(addrs['Анализатор']),
+                'P LO': GeneratorFactory(addrs['P LO']),
+                'P RF': GeneratorFactory(addrs['P RF']),
+                'Источник': SourceFactory(addrs['Источник']),
+                'Мультиметр': MultimeterFactory(addrs['Мультиметр']),
+            }
+
+        self.deviceParams = {
+            '+25': {
+                'adjust': 'adjust_+25.ini',
+                'result': 'table_+25.xlsx',
+            },
+            '-60': {
+                'adjust': 'adjust_-60.ini',
+                'result': 'table_-60.xlsx',
+            },
+            '+85': {
+                'adjust': 'adjust_+85.ini',
+                'result': 'table_+85.xlsx',
+            },
+        }
+
+        self.secondaryParams = load_ast_if_exists(params_file, default={
+            'Plo_min': -10.0,
+            'Plo_max': -10.0,
+            'Plo_delta': 1.0,
+            'Flo_min': 0.1,
+            'Flo_max': 3.0,
+            'Flo_delta': 0.1,
+            'is_Flo_x2': False,
+            'Prf': -10.0,
+            'Frf_min': 0.11,
+            'Frf_max': 3.1,
+            'Frf_delta': 0.1,
+            'Usrc': 5.0,
+            'UsrcD': 3.3,
+            'OscAvg': True,
+            'D': False,
+            'loss': 0.82,
+            'scale_y': 0.2,
+            'timebase_coeff': 1.0,
+        })
+
+        self._journal = Journal('journal.txt')
+
+        self._connect_params = load_ast_if_exists('connect_params.ini', default={
+            'timeout': 5.0,   # s, per instrument, counted from the moment it gets the bus
+            'bus_limit': 1,   # instruments on one GPIB board searched at a time, 0 -- no limit
+            'check_query': '*IDN?',   # health check for sessions kept from the previous connect
+            'retries': 1,   # session reopens for a command that failed on a lost connection, triggers are not re-sent
+        })
+        self._sessions = SessionPool(self.requiredInstruments, **self._connect_params)
+
+        self._trace_params = load_ast_if_exists('trace.ini', default={
+            'enabled': True,
+            'size': 100_000,   # last calls kept
+            'path': 'trace',
+        })
+        self._trace = ScpiTrace(self._trace_params['size'], self._trace_params['path'])
+
+        self._settle = Settler(**load_ast_if_exists('settle.ini', default={}), clock=clock)
+
+        self._sweep_params = load_ast_if_exists('sweep_params.ini', default={
+            'list_mode': False,   # upload LO/RF frequency and power lists, advance points with *TRG
+            'predict_range': True,   # preset OSC range from the previous points before the first acquisition
+            'range_margin': 2.2,
+            'range_lo_slope': 0.5,
+            'order': 'auto',   # 'canonical', 'serpentine', 'freq_major', 'range' or 'auto' -- cheapest by cost model,
+                               # 'range' uses the amplitudes of a resumed run's points, serpentine without them
+            'acquisition': 'stats',   # 'stats' -- scope measurement results, 'waveform' -- CH1/CH2 samples analyzed here
+            'waveform_points': 2000,
+            'cost': {   # expected settle time, s, per instrument
+                'lo': {'pow_change': 0.3, 'freq_change': 0.05, 'freq_span': 0.02},
+                'rf': {'pow_change': 0.3, 'freq_change': 0.05, 'freq_span': 0.02},
+                'osc': {'range_change': 2.0},
+            },
+        })
+
+        self._cost_model = CostModel.from_dict(self._sweep_params['cost'])
+
+        self._predictor = RangePredictor(
+            margin=self._sweep_params['range_margin'],
+            lo_slope=self._sweep_params['range_lo_slope'],
+        )
+
+        self._cal_params = load_ast_if_exists('cal_params.ini', default={
+            'mode': 'trace',   # 'trace' -- max hold wide span sweep, 'marker' -- re-center analyzer per point
+            'sweep_points': 10001,
+            'peak_window': 0.3,
+            'interp': 'linear',   # 'linear' or 'cubic' between calibration points
+            'freq_step': None,   # GHz, calibrate on a coarser grid than the measurement, None -- same as measurement
+            'max_age': 24,   # h, recalibrate after this even if instruments and settings did not change
+        })
+
+        self._cal_store = CalStore('cal', max_age=self._cal_params['max_age'] * 3600)
+
+        self._calibrated_pows_lo = CalTable.from_dict(load_ast_if_exists('cal_lo.ini', default={}), self._cal_params['interp'])
+        self._calibrated_pows_rf = CalTable.from_dict(load_ast_if_exists('cal_rf.ini', default={}), self._cal_params['interp'])
+
+        self._instruments = dict()
+        self.found = False
+        self.present = False
+        self.hasResult = False
+        self.only_main_states = False
+        self.calibrationRequired = ['LO', 'RF']
+
+        self.result = MeasureResult()
+
+    def __str__(self):
+        return f'{self._instruments}'
+
+    def connect(self, addrs):
+        print(f'searching for {addrs}')
+        for k, v in addrs.items():
+            self.requiredInstruments[k].addr = v
+        self.found = self._find()
+
+    def _find(self):
+        found = self._sessions.connect(on_found=self._instrument_found)
+        self._instruments = {
+            k: CachedInstrument(self._traced(k, v)) if v else v for k, v in found.items()
+        }
+        return all(self._instruments.values())
+
+    def _traced(self, name, instrument):
+        if not self._trace_params['enabled']:
+            return instrument
+        return TracedInstrument(instrument, name, self._trace)
+
+    def check(self, token, params):
+        print(f'call check with {token} {params}')
+        device, secondary = params
+        self.present = self._check(token, device, secondary)
+        print('sample pass')
+
+    def _check(self, token, device, secondary):
+        print(f'launch check with {self.deviceParams[device]} {self.secondaryParams}')
+        self._init()
+        self.calibrationRequired = self._load_calibration()
+        return True
+
+    def _load_calibration(self):
+        # reuse a stored calibration made with the same instruments and settings, report what needs recalibration
+        required = list()
+
+        lo = self._cal_store.load('LO', self._cal_key_lo())
+        if lo is None:
+            required.append('LO')
+        else:
+            pprint_to_file('cal_lo.ini', lo)
+            self._calibrated_pows_lo = CalTable.from_dict(lo, self._cal_params['interp'])
+
+        rf = self._cal_store.load('RF', self._cal_key_rf())
+        if rf is None:
+            required.append('RF')
+        else:
+            pprint_to_file('cal_rf.ini', rf)
+            self._calibrated_pows_rf = CalTable.from_dict(rf, self._cal_params['interp'])
+
+        return required
+
+    def _cal_key_lo(self):
+        secondary = self.secondaryParams
+        return {
+            'idn': [self._idn('P LO'), self._idn('Анализатор')],
+            'pow': [secondary['Plo_min'], secondary['Plo_max'], secondary['Plo_delta']],
+            'freq': [secondary['Flo_min'], secondary['Flo_max'], self._cal_params['freq_step'] or secondary['Flo_delta']],
+            'is_Flo_x2': secondary['is_Flo_x2'],
+            'D': secondary['D'],
+        }
+
+    def _cal_key_rf(self):
+        secondary = self.secondaryParams
+        return {
+            'idn': [self._idn('P RF'), self._idn('Анализатор')],
+            'pow': [secondary['Prf']],
+            'freq': [secondary['Frf_min'], secondary['Frf_max'], self._cal_params['freq_step'] or secondary['Frf_delta']],
+            'D': secondary['D'],
+        }
+
+    def _idn(self, name):
+        return self._instruments[name].query('*IDN?').strip()
+
+    def calibrate(self, token, params):
+        print(f'call calibrate with {token} {params}')
+        return self._calibrate(token, self.secondaryParams)
+
+    def _calibrateLO(self, token, secondary):
+        print('run calibrate LO with', secondary)
+
+        gen_lo = self._instruments['P LO']
+        sa = self._instruments['Анализатор']
+
+        secondary = self.secondaryParams
+
+        freq_lo_start = secondary['Flo_min']
+
+        plan = SweepPlan(secondary, freq_step=self._cal_params['freq_step'])
+        pow_lo_values = plan.pow_lo_values.tolist()
+        freq_lo_values = plan.freq_lo_values.tolist()
+
+        trace_mode = self._cal_params['mode'] == 'trace'
+        tracer = TraceCalibrator(sa, self._settle, self._cal_params['sweep_points'], self._cal_params['peak_window'])
+
+        self._reset_write_stats()
+        self._trace.start()
+
+        sa.send(':CAL:AUTO OFF')
+        if trace_mode:
+            tracer.prepare(freq_lo_values)
+        else:
+            sa.send(':SENS:FREQ:SPAN 1MHz')
+        sa.send(f'DISP:WIND:TRAC:Y:RLEV 10')
+        sa.send(f'DISP:WIND:TRAC:Y:PDIV 5')
+
+        gen_lo.send(f':OUTP:MOD:STAT OFF')
+
+        sa.send(':CALC:MARK1:MODE POS')
+
+        result = defaultdict(dict)
+        for pow_lo in pow_lo_values:
+            gen_lo.send(f'SOUR:POW {pow_lo}dbm')
+
+            if trace_mode:
+                losses = self._calibrate_trace(token, tracer, gen_lo, pow_lo, freq_lo_values)
+
+                if losses is None:
+                    gen_lo.send(f'OUTP:STAT OFF')
+                    tracer.finish()
+                    time.sleep(0.5)
+
+                    gen_lo.send(f'SOUR:POW {pow_lo}dbm')
+
+                    gen_lo.send(f'SOUR:FREQ {freq_lo_start}GHz')
+                    self._invalidate_state()
+                    raise RuntimeError('calibration cancelled')
+
+                result[pow_lo] = losses
+                continue
+
+            for freq in freq_lo_values:
+
+                if token.cancelled:
+                    gen_lo.send(f'OUTP:STAT OFF')
+                    time.sleep(0.5)
+
+                    gen_lo.send(f'SOUR:POW {pow_lo}dbm')
+
+                    gen_lo.send(f'SOUR:FREQ {freq_lo_start}GHz')
+                    self._invalidate_state()
+                    raise RuntimeError('calibration cancelled')
+
+                gen_lo.send(f'SOUR:FREQ {freq}GHz')
+                gen_lo.send(f'OUTP:STAT ON')
+
+                self._settle.wait_opc(gen_lo)
+
+                sa.send(f':SENSe:FREQuency:CENTer {freq}GHz')
+                sa.send(f':CALCulate:MARKer1:X:CENTer {freq}GHz')
+
+                pow_read = self._read_marker(sa, token)
+                loss = abs(pow_lo - pow_read)
+
+                print('loss: ', loss)
+                result[pow_lo][freq] = loss
+
+        print(self._write_report)
+        self._trace_done('cal_lo')
+
+        result = {k: v for k, v in result.items()}
+        pprint_to_file('cal_lo.ini', result)
+
+        gen_lo.send(f'OUTP:STAT OFF')
+        if trace_mode:
+            tracer.finish()
+        sa.send(':CAL:AUTO ON')
+        self._calibrated_pows_lo = CalTable.from_dict(result, self._cal_params['interp'])
+        self._cal_store.save('LO', self._cal_key_lo(), result)
+        if 'LO' in self.calibrationRequired:
+            self.calibrationRequired.remove('LO')
+        return True
+
+    def _calibrateRF(self, token, secondary):
+        print('run calibrate RF with', secondary)
+
+        gen_rf = self._instruments['P RF']
+        sa = self._instruments['Анализатор']
+
+        secondary = self.secondaryParams
+
+        pow_rf = secondary['Prf']
+
+        freq_rf_start = secondary['Frf_min']
+
+        freq_rf_values = SweepPlan(secondary, freq_step=self._cal_params['freq_step']).freq_rf_values.tolist()
+
+        trace_mode = self._cal_params['mode'] == 'trace'
+        tracer = TraceCalibrator(sa, self._settle, self._cal_params['sweep_points'], self._cal_params['peak_window'])
+
+        self._reset_write_stats()
+        self._trace.start()
+
+        sa.send(':CAL:AUTO OFF')
+        if trace_mode:
+            tracer.prepare(freq_rf_values)
+        else:
+            sa.send(':SENS:FREQ:SPAN 1MHz')
+        sa.send(f'DISP:WIND:TRAC:Y:RLEV 10')
+        sa.send(f'DISP:WIND:TRAC:Y:PDIV 5')
+
+        # gen_rf.send(f':OUTP:MOD:STAT OFF')
+        gen_rf.send(f'SOUR:POW {pow_rf}dbm')
+
+        sa.send(':CALC:MARK1:MODE POS')
+
+        result = {}
+        if trace_mode:
+            result = self._calibrate_trace(token, tracer, gen_rf, pow_rf, freq_rf_values)
+
+            if result is None:
+                gen_rf.send(f'OUTP:STAT OFF')
+                tracer.finish()
+                time.sleep(0.5)
+
+                gen_rf.send(f'SOUR:POW {pow_rf}dbm')
+
+                gen_rf.send(f'SOUR:FREQ {freq_rf_start}GHz')
+                self._invalidate_state()
+                raise RuntimeError('calibration cancelled')
+        else:
+            for freq in freq_rf_values:
+
+                if token.cancelled:
+                    gen_rf.send(f'OUTP:STAT OFF')
+                    time.sleep(0.5)
+
+                    gen_rf.send(f'SOUR:POW {pow_rf}dbm')
+
+                    gen_rf.send(f'SOUR:FREQ {freq_rf_start}GHz')
+                    self._invalidate_state()
+                    raise RuntimeError('calibration cancelled')
+
+                gen_rf.send(f'SOUR:FREQ {freq}GHz')
+                gen_rf.send(f'OUTP:STAT ON')
+
+                self._settle.wait_opc(gen_rf)
+
+                sa.send(f':SENSe:FREQuency:CENTer {freq}GHz')
+                sa.send(f':CALCulate:MARKer1:X:CENTer {freq}GHz')
+
+                pow_read = self._read_marker(sa, token)
+                loss = abs(pow_rf - pow_read)
+
+                print('loss: ', loss)
+                result[freq] = loss
+
+        print(self._write_report)
+        self._trace_done('cal_rf')
+
+        pprint_to_file('cal_rf.ini', result)
+
+        gen_rf.send(f'OUTP:STAT OFF')
+        if trace_mode:
+            tracer.finish()
+        sa.send(':CAL:AUTO ON')
+        self._calibrated_pows_rf = CalTable.from_dict(result, self._cal_params['interp'])
+        self._cal_store.save('RF', self._cal_key_rf(), result)
+        if 'RF' in self.calibrationRequired:
+            self.calibrationRequired.remove('RF')
+        return True
+
+    def _calibrate_trace(self, token, tracer, gen, pow_in, freqs):
+        pows_read = tracer.measure(token, gen, freqs)
+        if pows_read is None:
+            return None
+
+        losses = np.abs(pow_in - pows_read)
+        print('losses: ', losses)
+        return {freq: float(loss) for freq, loss in zip(freqs, losses)}
+
+    def measure(self, token, params):
+        print(f'call measure with {token} {params}')
+        device, _ = params
+        try:
+            self.result.set_secondary_params(self.secondaryParams)
+            self.result.set_primary_params(self.deviceParams[device])
+            self._measure(token, device)
+            # self.hasResult = bool(self.result)
+            self.hasResult = True  # HACK
+        except RuntimeError as ex:
+            print('runtime error:', ex)
+
+    def _measure(self, token, device):
+        param = self.deviceParams[device]
+        secondary = self.secondaryParams
+        print(f'launch measure with {token} {param} {secondary}')
+
+        self._clear()
+
+        self.calibrationRequired = self._load_calibration()
+        if self.calibrationRequired:
+            print(f'warning: measuring without up to date calibration: {self.calibrationRequired}')
+
+        self._measure_s_params(token, param, secondary)
+        return True
+
+    def batch(self, token, params):
+        print(f'call batch with {token} {params}')
+        batch = load_ast_if_exists('batch.ini', default={
+            'chamber': None,   # 'module:Class' chamber driver, 'local' -- simulated chamber for a dry run
+            'chamber_args': {},
+            'tolerance': 1.0,   # °C
+            'soak': 300.0,   # s
+            'timeout': 10800.0,   # s
+            'jobs': [{'profile': k, 'params': {}} for k in self.deviceParams],
+        })
+
+        try:
+            chamber = make_chamber(batch['chamber'], **batch['chamber_args'])
+        except RuntimeError as ex:
+            print('runtime error:', ex)
+            self.hasResult = False
+            return
+        runner = BatchRunner(self, chamber, batch['jobs'],
+                             tolerance=batch['tolerance'], soak=batch['soak'], timeout=batch['timeout'])
+        self.hasResult = bool(runner.run(token))
+
+    def resume(self, token, params):
+        print(f'call resume with {token} {params}')
+        device, _ = params
+        try:
+            self.result.set_secondary_params(self.secondaryParams)
+            self.result.set_primary_params(self.deviceParams[device])
+            self._resume(token, device)
+            self.hasResult = True  # HACK
+        except RuntimeError as ex:
+            print('runtime error:', ex)
+
+    def _resume(self, token, device):
+        param = self.deviceParams[device]
+        secondary = self.secondaryParams
+        print(f'launch resume with {token} {param} {secondary}')
+
+        header, entries = self._journal.load()
+        if header != {'primary': param, 'secondary': secondary}:
+            raise RuntimeError('journal does not match current measurement parameters')
+
+        self._clear()
+
+        done = {key: [raw_point, stats] for key, raw_point, stats in entries}
+        print(f'resuming after {len(done)} journaled points')
+
+        self._measure_s_params(token, param, secondary, done)
+        return True
+
+    def _clear(self):
+        self.result.clear()
+
+    def _init(self):
+        self._instruments['P LO'].send('*RST')
+        self._instruments['P RF'].send('*RST')
+        self._instruments['Осциллограф'].send('*RST')
+        self._instruments['Источник'].send('*RST')
+        self._instruments['Мультиметр'].send('*RST')
+        # self._instruments['Анализатор'].send('*RST')
+
+    def _measure_s_params(self, token, param, secondary, done=None):
+        gen_lo = self._instruments['P LO']
+        gen_rf = self._instruments['P RF']
+        osc = self._instruments['Осциллограф']
+        src = self._instruments['Источник']
+        mult = self._instruments['Мультиметр']
+        # sa = self._instruments['Анализатор']
+
+        src_u = secondary['Usrc']
+        src_i = 200  # mA
+        src_u_d = secondary['UsrcD']
+        src_i_d = 100  # mA
+        pow_lo_start = secondary['Plo_min']
+
+        pow_rf = secondary['Prf']
+        freq_rf_start = secondary['Frf_min']
+
+        loss = secondary['loss']
+
+        osc_avg = 'ON' if secondary['OscAvg'] else 'OFF'
+        d = secondary['D']
+
+        osc_scale = secondary['scale_y']
+
+        plan = SweepPlan(secondary, cal_lo=self._calibrated_pows_lo, cal_rf=self._calibrated_pows_rf)
+        if plan.mismatch:
+            raise RuntimeError(f'LO and RF frequency grids differ: '
+                               f'{len(plan.freq_lo_values)} vs {len(plan.freq_rf_values)} points')
+        self.result.reserve(len(plan))
+
+        src.send(f'APPLY p6v,{src_u}V,{src_i}mA')
+        src.send(f'APPLY p25v,{src_u_d}V,{src_i_d}mA')
+
+        osc.send(f':ACQ:AVERage {osc_avg}')
+
+        osc.send(f':CHANnel1:DISPlay ON')
+        osc.send(f':CHANnel2:DISPlay ON')
+
+        osc.send(f':CHAN1:SCALE {osc_scale}')  # V
+        osc.send(f':CHAN2:SCALE {osc_scale}')
+        osc.send(':TIMEBASE:SCALE 10E-8')  # ms / div
+
+        osc.send(':TRIGger:MODE EDGE')
+        osc.send(':TRIGger:EDGE:SOURCe CHANnel1')
+        osc.send(':TRIGger:LEVel CHANnel1,0')
+        osc.send(':TRIGger:EDGE:SLOPe POSitive')
+
+        osc.send(':MEASure:VAMPlitude channel1')
+        osc.send(':MEASure:VAMPlitude channel2')
+        osc.send(':MEASure:PHASe CHANnel1,CHANnel2')
+        osc.send(':MEASure:FREQuency CHANnel1')
+
+        # pow_lo_end = -5.0
+        # pow_lo_step = 5
+        gen_f_mul = 2 if d else 1
+
+        gen_lo.send(f':OUTP:MOD:STAT OFF')
+        # gen_rf.send(f':OUTP:MOD:STAT OFF')
+        gen_lo.send(f':FREQ:MULT {gen_f_mul}')
+        gen_rf.send(f':FREQ:MULT {gen_f_mul}')
+
+        capture = None
+        if self._sweep_params['acquisition'] == 'waveform':
+            capture = WaveformCapture(osc, points=self._sweep_params['waveform_points'])
+            capture.prepare()
+
+        self._settle.reset_stats()
+        self._reset_write_stats()
+        self._trace.start()
+
+        low_signal_threshold = 1.1
+        range_ratio = 1.2
+        upscale_ratio = 1.3
+
+        list_mode = self._sweep_params['list_mode']
+        lo_list_mode = list_points(gen_lo) if list_mode else 0
+        rf_list_mode = list_points(gen_rf) if list_mode else 0
+        print(f'list mode, max points: LO {lo_list_mode}, RF {rf_list_mode}')
+
+        # only amplitudes measured on this grid, points of the previous run may be another device or params
+        self._predictor.reset()
+        for (pow_lo, _, freq_rf), (raw_point, _) in (done or dict()).items():
+            self._predictor.seed(pow_lo, freq_rf, raw_point['ch1_amp'], raw_point['ch2_amp'])
+
+        order = plan_order(
+            plan.pow_lo_values.tolist(),
+            list(zip(plan.freq_lo_values.tolist(), plan.freq_rf_values.tolist())),
+            self._cost_model,
+            self._sweep_params['order'],
+            self._predictor.expected_amp
+        )
+
+        lo_sweep = make_sweep(gen_lo, plan.freq_lo[order].tolist(), plan.gen_pow_lo[order].tolist(), lo_list_mode)
+        rf_sweep = make_sweep(gen_rf, plan.freq_rf[order].tolist(), plan.gen_pow_rf[order].tolist(), rf_list_mode)
+        if not (lo_sweep.readback and rf_sweep.readback):
+            print('list mode: f_lo / f_rf are the commanded frequencies, not read back')
+
+        # every point goes to the journal as soon as it is measured, a crashed or cancelled run can be resumed
+        if done:
+            self._journal.resume()
+        else:
+            done = dict()
+            self._journal.start({'primary': param, 'secondary': secondary})
+
+        # raw points live in self.result, only the scope readouts are kept here for out.txt
+        stats_by_index = dict()
+        measured = 0
+        started = time.perf_counter()
+        # cancelled or failed runs leave the journal closed too, it is what resume reads
+        try:
+            lo_sweep.start()
+            rf_sweep.start()
+            for point_index in order:
+
+                pow_lo, freq_lo, freq_rf = plan.key(point_index)
+
+                if (pow_lo, freq_lo, freq_rf) in done:
+                    raw_point, stats = done[(pow_lo, freq_lo, freq_rf)]
+                    self._predictor.update(pow_lo, freq_rf, raw_point['ch1_amp'], raw_point['ch2_amp'])
+                    lo_sweep.skip()
+                    rf_sweep.skip()
+                    self._add_measure_point(raw_point, point_index)
+                    stats_by_index[point_index] = stats
+                    continue
+
+                if token.cancelled:
+                    self._cancel_measure(lo_sweep, rf_sweep, gen_lo, gen_rf, src, pow_rf, pow_lo_start, freq_rf_start)
+
+                lo_sweep.next()
+                rf_sweep.next()
+
+                # TODO hoist out of the loops
+                src.send('OUTPut ON')
+
+                gen_lo.send(f'OUTP:STAT ON')
+                gen_rf.send(f'OUTP:STAT ON')
+
+                # set OSC range from the neighbouring points, autoscale below only runs if the prediction misses
+                predicted_range = self._predictor.predict(pow_lo, freq_rf) if self._sweep_params['predict_range'] else None
+                if predicted_range is not None:
+                    osc.send(f':CHANnel1:RANGe {predicted_range}')
+                    osc.send(f':CHANnel2:RANGe {predicted_range}')
+
+                self._settle.wait_opc(gen_lo, gen_rf)
+
+                if capture:
+                    osc.send(f':TIMEBASE:SCALE {plan.timebase[point_index]}')  # ms / div
+                    try:
+                        amps, osc_phase, osc_ch1_freq, hit = capture.measure(token)
+                    except RuntimeError:
+                        if token.cancelled:
+                            self._cancel_measure(lo_sweep, rf_sweep, gen_lo, gen_rf, src, pow_rf, pow_lo_start, freq_rf_start)
+                        raise
+                    if predicted_range is not None:
+                        self._predictor.record(hit)
+
+                    # same fields as the measurement results: ch1_amp is read from scope CH2, ch2_amp from CH1
+                    osc_ch1_amp = float(amps[1])
+                    osc_ch2_amp = float(amps[0])
+                    stats = f'Waveform,{osc_ch1_freq:E},{osc_phase:E},{osc_ch2_amp:E},{osc_ch1_amp:E}'
+                else:
+                    osc.send(':CDISplay')
+
+                    # read amp values
+                    stats = self._read_osc_stats(osc, token)
+
+                    stats_split = stats.split(',')
+                    osc_ch1_amp = float(stats_split[18])
+                    osc_ch2_amp = float(stats_split[25])
+                    osc_phase = float(stats_split[11])
+                    osc_ch1_freq = float(stats_split[4])
+
+                    osc.send(f':TIMEBASE:SCALE {plan.timebase[point_index]}')  # ms / div
+                    osc.send(f':CHANnel1:OFFSet 0')
+                    osc.send(f':CHANnel2:OFFSet 0')
+
+                    max_amp = osc_ch1_amp if osc_ch1_amp > osc_ch2_amp else osc_ch2_amp
+
+                    # check if auto-scale is needed:
+                    # some of the measure points go out of OSC display range resulting in incorrect measurement
+                    # this is correct external device behaviour, not a program bug
+                    if max_amp < 1_000_000:
+                        # if reading is correct, check if the signal is too small
+                        big_amp, ch_num = (osc_ch1_amp, 1) if osc_ch1_amp > osc_ch2_amp else (osc_ch2_amp, 2)
+                        current_scale = float(osc.query(f':CHAN{ch_num}:SCALE?'))
+
+                        if predicted_range is not None:
+                            self._predictor.record(big_amp / current_scale > low_signal_threshold)
+
+                        # if signal fits in less than 1.5 sections of the display, is is too small, need to
+                        # auto scale OSC display up
+                        while big_amp / current_scale <= low_signal_threshold:
+
+                            if token.cancelled:
+                                self._cancel_measure(lo_sweep, rf_sweep, gen_lo, gen_rf, src, pow_rf, pow_lo_start, freq_rf_start)
+
+                            target_range = big_amp + big_amp * range_ratio
+
+                            osc.send(f':CHANnel1:RANGe {target_range}')
+                            osc.send(f':CHANnel2:RANGe {target_range}')
+
+                            osc.send(':CDIS')
+
+                            autofit_stats_split = self._read_osc_stats(osc, token).split(',')
+
+                            osc_ch1_amp = float(autofit_stats_split[18])
+                            osc_ch2_amp = float(autofit_stats_split[25])
+
+                            big_amp, ch_num = (osc_ch1_amp, 1) if osc_ch1_amp > osc_ch2_amp else (osc_ch2_amp, 2)
+                            current_scale = float(osc.query(f':CHAN{ch_num}:SCALE?'))
+                    # TODO fix this branch for small signal behaviour
+                    else:
+                        # if reading was not correct, reset OSC display range to safe level (controlled via GUI)
+                        # and iterate OSC range scaling a few times
+                        # to get the correct reading
+                        if predicted_range is not None:
+                            self._predictor.record(False)
+
+                        max_amp = osc_ch1_amp if osc_ch1_amp > osc_ch2_amp else osc_ch2_amp
+                        if max_amp > 1_000_000:
+                            new_scale = osc_scale * upscale_ratio
+
+                            osc.send(f':CHANnel1:scale {new_scale}')
+                            osc.send(f':CHANnel2:scale {new_scale}')
+
+                            osc.send(':CDIS')
+
+                            autofit_stats_split = self._read_osc_stats(osc, token).split(',')
+                            osc_ch1_amp = float(autofit_stats_split[18])
+                            osc_ch2_amp = float(autofit_stats_split[25])
+
+                            # check if safe level results in too small signal
+                            big_amp, ch_num = (osc_ch1_amp, 1) if osc_ch1_amp > osc_ch2_amp else (osc_ch2_amp, 2)
+
+                            while big_amp > 1_000_000:
+
+                                if token.cancelled:
+                                    self._cancel_measure(lo_sweep, rf_sweep, gen_lo, gen_rf, src, pow_rf, pow_lo_start, freq_rf_start)
+
+                                new_scale *= upscale_ratio
+
+                                osc.send(f':CHANnel1:scale {new_scale}')
+                                osc.send(f':CHANnel2:scale {new_scale}')
+
+                                osc.send(':CDIS')
+
+                                autofit_stats_split = self._read_osc_stats(osc, token).split(',')
+
+                                osc_ch1_amp = float(autofit_stats_split[18])
+                                osc_ch2_amp = float(autofit_stats_split[25])
+
+                                big_amp, ch_num = (osc_ch1_amp, 1) if osc_ch1_amp > osc_ch2_amp else (osc_ch2_amp, 2)
+                            else:
+                                # if safe level is acceptable, select largest signal
+                                # and fit the display to 130% of the signal
+                                target_range = big_amp * range_ratio
+                                osc.send(f':CHANnel1:RANGe {target_range}')
+                                osc.send(f':CHANnel2:RANGe {target_range}')
+
+                    # read actual amp values after auto-scale (if any occured)
+                    osc.send(':CDIS')
+
+                    stats = self._read_osc_stats(osc, token)
+                    stats_split = stats.split(',')
+                    osc_ch1_amp = float(stats_split[18])
+                    osc_ch2_amp = float(stats_split[25])
+
+                self._predictor.update(pow_lo, freq_rf, osc_ch1_amp, osc_ch2_amp)
+
+                f_lo_read = lo_sweep.point_freq()
+                f_rf_read = rf_sweep.point_freq()
+
+                if self._settle.watch_current:
+                    i_src_read = float(self._settle.read_stable(lambda: mult.query('MEAS:CURR:DC? 1A,DEF'), token=token))
+                else:
+                    i_src_read = float(mult.query('MEAS:CURR:DC? 1A,DEF'))
+
+                raw_point = {
+                    'p_lo': pow_lo,
+                    'f_lo': f_lo_read,
+                    'p_rf': pow_rf,
+                    'f_rf': f_rf_read,
+                    'u_src': src_u,  # power source voltage
+                    'i_src': i_src_read,
+                    'ch1_amp': osc_ch1_amp,
+                    'ch2_amp': osc_ch2_amp,
+                    'phase': osc_phase,
+                    'ch1_freq': osc_ch1_freq,
+                    'loss': loss,
+                }
+
+                print(raw_point, stats)
+                self._journal.append((pow_lo, freq_lo, freq_rf), raw_point, stats)
+                self._add_measure_point(raw_point, point_index)
+
+                # time.sleep(120)
+
+                stats_by_index[point_index] = stats
+
+                measured += 1
+                eta = plan.eta(measured, time.perf_counter() - started, len(plan) - len(stats_by_index))
+                print(f'point {len(stats_by_index)}/{len(plan)}, eta {eta:0.0f} s')
+
+            lo_sweep.stop()
+            rf_sweep.stop()
+
+            if capture:
+                capture.finish()
+                print(f'waveform: {capture.captures} captures, {capture.reranges} re-ranges')
+        finally:
+            self._journal.close()
+
+        # back to canonical grid order regardless of the measurement order
+        res = [[raw_point, stats_by_index[i]] for i, raw_point in self.result.raw_points()]
+
+        gen_lo.send(f'OUTP:STAT OFF')
+        gen_rf.send(f'OUTP:STAT OFF')
+        time.sleep(0.5)
+        src.send('OUTPut OFF')
+
+        gen_rf.send(f'SOUR:POW {pow_rf}dbm')
+        gen_lo.send(f'SOUR:POW {pow_lo_start}dbm')
+
+        gen_rf.send(f'SOUR:FREQ {freq_rf_start}GHz')
+        gen_lo.send(f'SOUR:FREQ {freq_rf_start}GHz')
+
+        print(self._settle.report)
+        print(self._predictor.report)
+        print(self._write_report)
+        self._trace_done('measure')
+
+        with open('out.txt', mode='wt', encoding='utf-8') as f:
+            f.write(str(res))
+
+        return res
+
+    def _cancel_measure(self, lo_sweep, rf_sweep, gen_lo, gen_rf, src, pow_rf, pow_lo_start, freq_rf_start):
+        lo_sweep.stop()
+        rf_sweep.stop()
+        gen_lo.send(f'OUTP:STAT OFF')
+        gen_rf.send(f'OUTP:STAT OFF')
+        time.sleep(0.5)
+        src.send('OUTPut OFF')
+
+        gen_rf.send(f'SOUR:POW {pow_rf}dbm')
+        gen_lo.send(f'SOUR:POW {pow_lo_start}dbm')
+
+        gen_rf.send(f'SOUR:FREQ {freq_rf_start}GHz')
+        gen_lo.send(f'SOUR:FREQ {freq_rf_start}GHz')
+        self._invalidate_state()
+        raise RuntimeError('measurement cancelled')
+
+    def _read_osc_stats(self, osc, token):
+        return self._settle.read_stable(lambda: osc.query(':MEASure:RESults?'), key=_osc_amps, token=token)
+
+    def _read_marker(self, sa, token):
+        return float(self._settle.read_stable(lambda: sa.query(':CALCulate:MARKer:Y?'), token=token))
+
+    def _invalidate_state(self):
+        for instr in self._instruments.values():
+            instr.invalidate()
+
+    def _reset_write_stats(self):
+        for instr in self._instruments.values():
+            instr.reset_stats()
+
+    def _trace_done(self, run):
+        if not self._trace_params['enabled']:
+            return
+        print(self._trace.report)
+        print(f'scpi trace saved to {self._trace.export(run)}-*')
+
+    @property
+    def _write_report(self):
+        return 'skipped writes: ' + ', '.join(
+            f'{k} {v.skipped}/{v.sent + v.skipped}' for k, v in self._instruments.items()
+        )
+
+    def _add_measure_point(self, data, index=None):
+        print('measured point:', data)
+        self.result.add_point(data, index)
+        self._point_ready(self.result.last_point)
+
+    def _instrument_found(self, name, status):
+        pass
+
+    def _point_ready(self, point):
+        pass
+
+    def saveConfigs(self):
+        pprint_to_file(self._params_file, self.secondaryParams)
+
+    @property
+    def status(self):
+        return [i.status for i in self._instruments.values()]
+
+
+def _osc_amps(stats):
+    stats_split = stats.split(',')
+    return float(stats_split[18]), float(stats_split[25])
@@ -0,0 +1,137 @@
+import datetime
+import os
+import time
+
+from collections import defaultdict, deque
+
+import numpy as np
+
+from statecache import normalize
+from forgot_again.file import pprint_to_file
+
+# s, log spaced from 0.1 ms to 10 s
+bins = np.logspace(-4, 1, 21)
+
+
+class ScpiTrace:
+    def __init__(self, size=100_000, path='trace'):
+        # every send/query that reached the bus: (s since start, instrument, command, s, response chars)
+        self._records = deque(maxlen=size)
+        self._start = time.perf_counter()
+        self.path = path
+        self.calls = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def start(self):
+        self._records.clear()
+        self._start = time.perf_counter()
+        self.calls = 0
+
+    def record(self, name, command, start, duration, size):
+        self._records.append((start - self._start, name, command, duration, size))
+        self.calls += 1
+
+    def histograms(self):
+        by_instrument = defaultdict(list)
+        by_command = defaultdict(list)
+        for _, name, command, duration, _ in self._records:
+            by_instrument[name].append(duration)
+            by_command[command_class(command)].append(duration)
+
+        return {
+            'bins': [float(f'{b:0.3g}') for b in bins],
+            'instrument': {k: _stats(v) for k, v in by_instrument.items()},
+            'command': {k: _stats(v) for k, v in by_command.items()},
+        }
+
+    def export(self, run):
+        os.makedirs(self.path, exist_ok=True)
+        prefix = os.path.join(self.path, f'{datetime.datetime.now().isoformat().replace(":", ".")}-{run}')
+
+        with open(f'{prefix}-scpi.txt', mode='wt', encoding='utf-8') as f:
+            for t, name, command, duration, size in self._records:
+                f.write(f'{t:0.6f}\t{name}\t{command}\t{duration * 1000:0.3f}\t{size}\n')
+        pprint_to_file(f'{prefix}-latency.ini', self.histograms())
+        return prefix
+
+    @property
+    def report(self):
+        totals = defaultdict(float)
+        for _, name, _, duration, _ in self._records:
+            totals[name] += duration
+        busiest = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)
+        dropped = f', {self.calls - len(self._records)} dropped' if self.calls > len(self._records) else ''
+        return f'scpi: {self.calls} calls{dropped}, {sum(totals.values()):0.1f} s on the bus: ' + \
+            ', '.join(f'{k} {v:0.1f} s' for k, v in busiest)
+
+
+class TracedInstrument:
+    def __init__(self, instrument, name, trace):
+        self._instrument = instrument
+        self._name = name
+        self._trace = trace
+
+    def __getattr__(self, item):
+        attr = getattr(self._instrument, item)
+        if item == 'query_binary_values':
+            return self._traced_binary(attr)
+        return attr
+
+    def __repr__(self):
+        return repr(self._instrument)
+
+    def __str__(self):
+        return str(self._instrument)
+
+    def _traced_binary(self, method):
+        # binary block transfers are traced like queries, size is the value count
+        def query_binary_values(question, *args, **kwargs):
+            start = time.perf_counter()
+            values = None
+            try:
+                values = method(question, *args, **kwargs)
+                return values
+            finally:
+                self._trace.record(self._name, question, start, time.perf_counter() - start,
+                                   len(values) if values is not None else -1)
+        return query_binary_values
+
+    def send(self, command):
+        start = time.perf_counter()
+        try:
+            return self._instrument.send(command)
+        finally:
+            self._trace.record(self._name, command, start, time.perf_counter() - start, 0)
+
+    def query(self, question):
+        start = time.perf_counter()
+        answer = None
+        try:
+            answer = self._instrument.query(question)
+            return answer
+        finally:
+            self._trace.record(self._name, question, start, time.perf_counter() - start,
+                               len(answer) if answer is not None else -1)
+
+
+def command_class(command):
+    # ':CHANnel1:RANGe 0.2' -> 'CHAN1:RANG', ':MEASure:RESults?' -> 'MEAS:RES?'
+    header = command.strip().partition(' ')[0]
+    query = header.endswith('?')
+    return normalize(header.rstrip('?')) + ('?' if query else '')
+
+
+def _stats(durations):
+    durations = np.asarray(durations)
+    counts, _ = np.histogram(np.clip(durations, bins[0], bins[-1]), bins=bins)
+    return {
+        'count': len(durations),
+        'total': round(float(durations.sum()), 6),
+        'mean': round(float(durations.mean()), 6),
+        'p50': round(float(np.percentile(durations, 50)), 6),
+        'p95': round(float(np.percentile(durations, 95)), 6),
+        'max': round(float(durations.max()), 6),
+        'hist': counts.tolist(),
+    }
@@ -0,0 +1,115 @@
+import threading
+
+from discovery import find_all, find, close
+
+# VISA status of a session that is gone: invalid session, connection lost; timeouts and SCPI errors are not retried
+_lost_codes = {-1073807346, -1073807194}
+# commands that act every time they are written, a lost one is not sent again on the new session
+_no_resend = ('*TRG', 'INIT', 'DIG')
+
+
+class SessionPool:
+    def __init__(self, factories, timeout=5.0, bus_limit=1, check_query='*IDN?', retries=1):
+        # keeps instrument sessions open between connects, reopens only the ones that dropped
+        self._factories = factories
+        self._timeout = timeout
+        self._bus_limit = bus_limit
+        self.check_query = check_query   # cheap query every instrument answers
+        self.retries = retries   # reopen attempts for a command that failed on a dropped session, idempotent ones only
+
+        self._sessions = dict()   # name -> (addr, instrument)
+        self._lock = threading.Lock()
+
+        self.reopened = 0
+
+    def connect(self, on_found=None):
+        stale = dict()
+        for name, factory in self._factories.items():
+            addr, instrument = self._sessions.get(name, (None, None))
+            if instrument and addr == factory.addr and self._alive(instrument):
+                print(f'{name}: session kept')
+                if on_found:
+                    on_found(name, str(instrument.status))
+            else:
+                self._close(name)
+                stale[name] = factory
+
+        found = find_all(stale, timeout=self._timeout, bus_limit=self._bus_limit, on_found=on_found)
+        for name, instrument in found.items():
+            if instrument:
+                self._sessions[name] = self._factories[name].addr, instrument
+
+        return {name: PooledInstrument(self, name) if name in self._sessions else None for name in self._factories}
+
+    def session(self, name):
+        try:
+            return self._sessions[name][1]
+        except KeyError:
+            raise RuntimeError(f'{name}: session lost')
+
+    def call(self, name, method, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return getattr(self.session(name), method)(*args)
+            except Exception as ex:
+                if attempt == self.retries or not self._lost(name, ex):
+                    raise
+                print(f'{name}: {ex}, reopening session')
+                self.reopen(name)
+                if method == 'send' and _triggers(args[0]):
+                    raise
+
+    def reopen(self, name):
+        with self._lock:
+            self._close(name)
+            instrument = find(self._factories[name], self._timeout)
+            if instrument:
+                self._sessions[name] = self._factories[name].addr, instrument
+                self.reopened += 1
+            return instrument
+
+    def _lost(self, name, ex):
+        if name not in self._sessions:
+            return True
+        if getattr(ex, 'error_code', None) not in _lost_codes and not isinstance(ex, ConnectionError):
+            return False
+        # a session that still answers was not lost, the error belongs to the command
+        return not self._alive(self._sessions[name][1])
+
+    def _alive(self, instrument):
+        try:
+            instrument.query(self.check_query)
+        except Exception:
+            return False
+        return True
+
+    def _close(self, name):
+        _, instrument = self._sessions.pop(name, (None, None))
+        if instrument is not None:
+            close(instrument)
+
+
+class PooledInstrument:
+    # stands in for the instrument, follows the session through reopens
+    def __init__(self, pool, name):
+        self._pool = pool
+        self._name = name
+
+    def __getattr__(self, item):
+        return getattr(self._pool.session(self._name), item)
+
+    def __repr__(self):
+        return repr(self._pool.session(self._name))
+
+    def __str__(self):
+        return str(self._pool.session(self._name))
+
+    def send(self, command):
+        return self._pool.call(self._name, 'send', command)
+
+    def query(self, question):
+        return self._pool.call(self._name, 'query', question)
+
+
+def _triggers(command):
+    return command.strip().lstrip(':').upper().startswith(_no_resend)
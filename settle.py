@@ -0,0 +1,103 @@
+import time
+
+
+class Clock:
+    # wall clock, the simulated rig passes its own so that settle delays follow its time scale
+    def now(self):
+        return time.perf_counter()
+
+    def advance(self, delay):
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Settler:
+    def __init__(self, timeout=6.0, poll_interval=0.15, min_delay=0.2, rel_tol=0.02, abs_tol=1e-4, stable_reads=2,
+                 watch_current=False, clock=None):
+        self.timeout = timeout   # s, give up and use the last reading
+        self.poll_interval = poll_interval   # s
+        self.min_delay = min_delay   # s, let the instrument drop stale readings after a clear/retune
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self.stable_reads = stable_reads   # consecutive readings within tolerance
+        self.watch_current = watch_current   # also wait for the multimeter current to settle
+        self.clock = clock or Clock()
+
+        self.waits = 0
+        self.timeouts = 0
+        self.cancels = 0
+        self.wait_time = 0.0
+
+    def reset_stats(self):
+        self.waits = 0
+        self.timeouts = 0
+        self.cancels = 0
+        self.wait_time = 0.0
+
+    def wait_opc(self, *instruments):
+        start = self.clock.now()
+        deadline = start + self.timeout
+        for instr in instruments:
+            while not _opc_done(instr):
+                if self.clock.now() > deadline:
+                    print(f'settle: *OPC? timeout on {instr}')
+                    self.timeouts += 1
+                    break
+                self.clock.advance(self.poll_interval)
+        self.wait_time += self.clock.now() - start
+
+    def read_stable(self, read, key=None, token=None):
+        key = key or (lambda v: v)
+
+        start = self.clock.now()
+        deadline = start + self.timeout
+        self.waits += 1
+
+        self.clock.advance(self.min_delay)
+
+        value = read()
+        prev = _as_tuple(key(value))
+        stable = 0
+        while self.clock.now() < deadline:
+            if token is not None and token.cancelled:
+                self.cancels += 1
+                self.wait_time += self.clock.now() - start
+                return value
+
+            self.clock.advance(self.poll_interval)
+
+            value = read()
+            current = _as_tuple(key(value))
+            if self._is_close(prev, current):
+                stable += 1
+                if stable >= self.stable_reads:
+                    self.wait_time += self.clock.now() - start
+                    return value
+            else:
+                stable = 0
+            prev = current
+
+        print('settle: reading did not stabilize, using last value')
+        self.timeouts += 1
+        self.wait_time += self.clock.now() - start
+        return value
+
+    def _is_close(self, prev, current):
+        return all(abs(a - b) <= self.abs_tol + self.rel_tol * abs(b) for a, b in zip(prev, current))
+
+    @property
+    def report(self):
+        return f'settle: {self.waits} waits, {self.timeouts} timeouts, {self.cancels} cancelled, {self.wait_time:0.1f} s total'
+
+
+def _opc_done(instr):
+    try:
+        return int(float(instr.query('*OPC?'))) == 1
+    except ValueError:
+        return False
+
+
+def _as_tuple(value):
+    if isinstance(value, (tuple, list)):
+        return tuple(float(v) for v in value)
+    return float(value),
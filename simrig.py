@@ -0,0 +1,576 @@
+import re
+import threading
+import time
+
+from math import log10, sqrt
+
+import numpy as np
+
+from statecache import normalize
+
+GHz = 1_000_000_000
+
+INVALID = 9.9e37   # what the scope returns for a measurement it can't make
+
+_number = re.compile(r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([a-zA-Z]*)\s*')
+_units = {
+    '': 1, 'HZ': 1, 'KHZ': 1e3, 'MHZ': 1e6, 'GHZ': 1e9,
+    'DBM': 1, 'DB': 1,
+    'V': 1, 'MV': 1e-3, 'A': 1, 'MA': 1e-3,
+    'S': 1, 'MS': 1e-3,
+}
+
+# s, on top of the VISA round trip
+_latency = {
+    'find': 0.05,
+    'write': 0.002,
+    'query': 0.004,
+    'osc_results': 0.03,   # scope gathers measurement statistics
+    'sweep': 0.05,   # analyzer single sweep
+    'digitize': 0.02,   # scope single acquisition of both channels
+    'waveform': 0.005,   # scope waveform block transfer
+    'gen_settle': 0.02,   # synthesizer settling after a frequency or power change
+    'list_settle': 0.002,   # list mode step, the list is already loaded
+}
+
+_noise = {
+    'amp': 0.005,   # relative, per acquisition
+    'adc': 0.004,   # of the vertical scale, per acquisition
+    'phase': 0.3,   # deg
+    'freq': 0.0001,   # relative
+    'current': 0.0005,   # A
+    'sa': 0.05,   # dB
+}
+
+# dB of one cable segment: a + b * sqrt(f, GHz), the analyzer sees the generators through two segments
+_cable = {
+    'lo': [1.0, 0.8],
+    'rf': [1.0, 0.8],
+}
+
+
+class SimClock:
+    def __init__(self, time_scale=1.0):
+        # simulated time is real time plus the part of every simulated delay that was not slept,
+        # time_scale 0 runs as fast as the controller can go, 1 in real time
+        self.time_scale = time_scale
+        self._start = time.perf_counter()
+        self._skipped = 0.0
+        self._lock = threading.Lock()
+
+    def now(self):
+        return time.perf_counter() - self._start + self._skipped
+
+    def advance(self, delay):
+        if delay <= 0:
+            return
+        time.sleep(delay * self.time_scale)
+        with self._lock:
+            self._skipped += delay * (1 - self.time_scale)
+
+    def wait_until(self, moment):
+        self.advance(moment - self.now())
+
+
+class DemodulatorModel:
+    def __init__(self, gain=-18.0, gain_slope=-0.5, lo_nominal=0.0, lo_slope=0.5, imbalance=0.3, phase_error=2.0,
+                 phase_slope=0.5, if_bandwidth=0.5, current=0.1, supply=5.0, lo_div=1):
+        self.gain = gain   # dB, conversion gain at nominal LO drive
+        self.gain_slope = gain_slope   # dB / GHz of RF frequency
+        self.lo_nominal = lo_nominal   # dBm, LO drive where conversion gain stops growing
+        self.lo_slope = lo_slope   # dB of IF amplitude per dB of LO below nominal
+        self.imbalance = imbalance   # dB, I over Q
+        self.phase_error = phase_error   # deg, off quadrature
+        self.phase_slope = phase_slope   # deg / GHz of RF frequency
+        self.if_bandwidth = if_bandwidth   # GHz, first order roll-off
+        self.current = current   # A, at nominal supply
+        self.supply = supply   # V, nominal
+        self.lo_div = lo_div   # 2 for devices with an internal LO divider (is_Flo_x2)
+
+    def response(self, lo_level, lo_freq, rf_level, rf_freq, supply):
+        # I and Q amplitudes (V), phase I to Q (deg) and IF frequency (Hz), None if nothing comes out
+        if supply < self.supply * 0.8:
+            return None
+
+        lo_freq /= self.lo_div
+        f_if = abs(rf_freq - lo_freq)
+        rf_ghz = rf_freq / GHz
+
+        p_if = rf_level + self.gain + self.gain_slope * rf_ghz + min(0.0, (lo_level - self.lo_nominal) * self.lo_slope)
+        p_if -= 10 * log10(1 + (f_if / GHz / self.if_bandwidth) ** 2)
+
+        # inverse of the P IF formula in MeasureResult
+        amp = 20 * 10 ** ((p_if - 30) / 20)
+        sideband = 1 if rf_freq >= lo_freq else -1
+        phase = -90 * sideband + self.phase_error + self.phase_slope * rf_ghz
+        return amp * 10 ** (self.imbalance / 40), amp * 10 ** (-self.imbalance / 40), phase, f_if
+
+    def draw(self, supply):
+        if supply < self.supply * 0.8:
+            return 0.0
+        return self.current * supply / self.supply
+
+
+class SimRig:
+    def __init__(self, time_scale=1.0, seed=None, acq_rate=200.0, settle_dip=10.0,
+                 latency=None, noise=None, cable=None, dut=None):
+        self.clock = SimClock(time_scale)
+        self.rng = np.random.default_rng(seed)
+        self.acq_rate = acq_rate   # scope acquisitions per s, statistics average over them
+        self.settle_dip = settle_dip   # dB the generator output is off while settling
+
+        self.latency = {**_latency, **(latency or {})}
+        self.noise = {**_noise, **(noise or {})}
+        self.cable = {**_cable, **(cable or {})}
+        self.dut = DemodulatorModel(**(dut or {}))
+
+        self.osc = SimOscilloscope(self)
+        self.sa = SimAnalyzer(self)
+        self.gen_lo = SimGenerator(self)
+        self.gen_rf = SimGenerator(self)
+        self.src = SimSource(self)
+        self.mult = SimMultimeter(self)
+
+    def cable_loss(self, path, freq):
+        a, b = self.cable[path]
+        return a + b * sqrt(freq / GHz)
+
+    def if_signal(self, t):
+        lo, rf = self.gen_lo.level(t), self.gen_rf.level(t)
+        if lo is None or rf is None:
+            return None
+        lo_freq, rf_freq = self.gen_lo.frequency(), self.gen_rf.frequency()
+        return self.dut.response(lo - self.cable_loss('lo', lo_freq), lo_freq,
+                                 rf - self.cable_loss('rf', rf_freq), rf_freq, self.src.voltage())
+
+    def spectrum(self, t):
+        # (Hz, dBm) of every line the analyzer sees
+        lines = list()
+        for path, gen in (('lo', self.gen_lo), ('rf', self.gen_rf)):
+            level = gen.level(t)
+            if level is not None:
+                freq = gen.frequency()
+                lines.append((freq, level - 2 * self.cable_loss(path, freq)))
+        return lines
+
+    def gauss(self, sigma):
+        return float(self.rng.normal(0.0, sigma)) if sigma > 0 else 0.0
+
+
+class SimInstrument:
+    model = 'SIM'
+
+    def __init__(self, rig):
+        self._rig = rig
+        self.addr = ''
+        self.reset()
+
+    def __repr__(self):
+        return f'{self.model}({self.addr})'
+
+    @property
+    def status(self):
+        return f'{self.model} at {self.addr}'
+
+    def reset(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, command):
+        self._rig.clock.advance(self._rig.latency['write'])
+        header, _, value = command.strip().partition(' ')
+        header = normalize(header)
+        if header == '*RST':
+            self.reset()
+        else:
+            self._write(header, value.strip())
+
+    def query(self, question):
+        self._rig.clock.advance(self._rig.latency['query'])
+        header, _, value = question.strip().partition(' ')
+        header = normalize(header.rstrip('?'))
+        if header == '*IDN':
+            return f'Simulated,{self.model},0,1.0\n'
+        if header == '*OPC':
+            self._wait_complete()
+            return '1\n'
+        answer = self._read(header, value.strip())
+        if answer is None:
+            raise RuntimeError(f'{self.model}: unsupported query {question}')
+        return f'{answer}\n'
+
+    def _write(self, header, value):
+        pass
+
+    def _read(self, header, value):
+        return None
+
+    def _wait_complete(self):
+        pass
+
+
+class SimGenerator(SimInstrument):
+    model = 'SIM-SG'
+
+    def reset(self):
+        self.freq = 1 * GHz
+        self.power = -20.0
+        self.output = False
+        self.mult = 1   # external multiplier, the device sees the displayed frequency
+
+        self.list_freqs = list()
+        self.list_pows = list()
+        self.list_index = 0
+        self.max_list = 1601
+        self.freq_mode = 'CW'
+        self.pow_mode = 'FIX'
+
+        self._settled_at = 0.0
+
+    def level(self, t):
+        # dBm at the output, None when off
+        if not self.output:
+            return None
+        power = self.list_pows[self.list_index] if self.pow_mode == 'LIST' and self.list_pows else self.power
+        return power - (self._rig.settle_dip if t < self._settled_at else 0.0)
+
+    def frequency(self):
+        if self.freq_mode == 'LIST' and self.list_freqs:
+            return self.list_freqs[self.list_index]
+        return self.freq
+
+    def _write(self, header, value):
+        if header.startswith('SOUR:'):
+            header = header[5:]
+
+        if header == 'FREQ':
+            self.freq = _parse(value)
+            self._retune(self._rig.latency['gen_settle'])
+        elif header == 'POW':
+            self.power = _parse(value)
+            self._retune(self._rig.latency['gen_settle'])
+        elif header in ('OUTP', 'OUTP:STAT'):
+            output = _on(value)
+            if output and not self.output:
+                self._retune(self._rig.latency['gen_settle'])
+            self.output = output
+        elif header == 'FREQ:MULT':
+            self.mult = int(_parse(value))
+        elif header in ('LIST:FREQ', 'LIST:POW'):
+            values = [float(v) for v in value.split(',')]
+            if len(values) > self.max_list:
+                raise RuntimeError(f'{self.model}: list too long, {len(values)} > {self.max_list} points')
+            if header == 'LIST:FREQ':
+                self.list_freqs = values
+            else:
+                self.list_pows = values
+        elif header == 'FREQ:MODE':
+            self.freq_mode = value.upper()
+        elif header == 'POW:MODE':
+            self.pow_mode = value.upper()
+        elif header == 'INIT':
+            self.list_index = 0
+            self._retune(self._rig.latency['gen_settle'])
+        elif header == '*TRG':
+            self.list_index = min(self.list_index + 1, max(len(self.list_freqs), len(self.list_pows)) - 1)
+            self._retune(self._rig.latency['list_settle'])
+
+    def _read(self, header, value):
+        if header.startswith('SOUR:'):
+            header = header[5:]
+
+        if header == 'FREQ':
+            return f'{self.frequency():+.11E}'
+        if header == 'POW':
+            return f'{self.power:+.2f}'
+        if header == 'LIST:FREQ:POIN':
+            return f'{self.max_list if value.strip().upper() == "MAX" else len(self.list_freqs)}'
+        return None
+
+    def _wait_complete(self):
+        self._rig.clock.wait_until(self._settled_at)
+
+    def _retune(self, settle):
+        self._settled_at = max(self._settled_at, self._rig.clock.now() + settle)
+
+
+class SimSource(SimInstrument):
+    model = 'SIM-PS'
+
+    def reset(self):
+        self.outputs = dict()   # P6V -> (V, A)
+        self.output = False
+
+    def voltage(self, name='P6V'):
+        if not self.output:
+            return 0.0
+        return self.outputs.get(name, (0.0, 0.0))[0]
+
+    def _write(self, header, value):
+        if header == 'APPL':
+            name, volts, amps = value.split(',')
+            self.outputs[name.strip().upper()] = _parse(volts), _parse(amps)
+        elif header in ('OUTP', 'OUTP:STAT'):
+            self.output = _on(value)
+
+
+class SimMultimeter(SimInstrument):
+    model = 'SIM-DMM'
+
+    def _read(self, header, value):
+        if header == 'MEAS:CURR:DC':
+            current = self._rig.dut.draw(self._rig.src.voltage())
+            return f'{current + self._rig.gauss(self._rig.noise["current"]):+.8E}'
+        return None
+
+
+class SimOscilloscope(SimInstrument):
+    model = 'SIM-OSC'
+
+    _channel = re.compile(r'CHAN(\d):(SCAL|RANG|OFFS|DISP)')
+
+    def reset(self):
+        self.scales = {1: 1.0, 2: 1.0}   # V / div, 8 divisions on screen
+        self.timebase = 1e-6   # s / div, 10 divisions on screen
+        self.averaging = False
+        self.measurements = list()
+        self._cleared_at = self._rig.clock.now()
+
+        self.wave_points = 1000
+        self.wave_format = 'WORD'
+        self.wave_source = 1
+        self._waves = dict()   # channel -> (int16 codes, V per code)
+        self._dt = 0.0
+
+    def query_binary_values(self, question, datatype='h', is_big_endian=True):
+        self._rig.clock.advance(self._rig.latency['query'] + self._rig.latency['waveform'])
+        if normalize(question.strip().rstrip('?')) != 'WAV:DATA':
+            raise RuntimeError(f'{self.model}: unsupported binary query {question}')
+        return self._waves[self.wave_source][0].tolist()
+
+    def _write(self, header, value):
+        match = self._channel.fullmatch(header)
+        if match:
+            channel, node = int(match.group(1)), match.group(2)
+            if node == 'SCAL':
+                self.scales[channel] = _parse(value)
+            elif node == 'RANG':
+                self.scales[channel] = _parse(value) / 8
+        elif header == 'ACQ:AVER':
+            self.averaging = _on(value)
+        elif header in ('MEAS:VAMP', 'MEAS:PHAS', 'MEAS:FREQ'):
+            self._add_measurement(header[5:], tuple(int(c) for c in re.findall(r'\d+', value)))
+        elif header == 'CDIS':
+            self._cleared_at = self._rig.clock.now()
+        elif header == 'TIM:SCAL':
+            self.timebase = _parse(value)
+        elif header == 'WAV:POIN':
+            self.wave_points = int(_parse(value))
+        elif header == 'WAV:FORM':
+            self.wave_format = value.upper()[:3]
+        elif header == 'WAV:SOUR':
+            self.wave_source = int(re.findall(r'\d+', value)[0])
+        elif header == 'DIG':
+            self._digitize()
+
+    def _read(self, header, value):
+        match = self._channel.fullmatch(header)
+        if match and match.group(2) == 'SCAL':
+            return f'{self.scales[int(match.group(1))]:+.5E}'
+        if header == 'MEAS:RES':
+            self._rig.clock.advance(self._rig.latency['osc_results'])
+            return self._results()
+        if header == 'WAV:PRE':
+            codes, y_increment = self._waves[self.wave_source]
+            return f'{1 if self.wave_format == "WOR" else 4},0,{len(codes)},1,{self._dt:+.6E},0,0,{y_increment:+.6E},0,0'
+        if header == 'WAV:DATA':
+            self._rig.clock.advance(self._rig.latency['waveform'])
+            codes, y_increment = self._waves[self.wave_source]
+            return ','.join(f'{v:+.6E}' for v in codes * y_increment)
+        return None
+
+    def _digitize(self):
+        # one acquisition of both channels, 8 bit ADC over 8 divisions, clipped at the screen edges
+        self._rig.clock.advance(self._rig.latency['digitize'])
+        signal = self._rig.if_signal(self._rig.clock.now())
+        i_amp, q_amp, phase, f_if = signal if signal else (0.0, 0.0, 0.0, 0.0)
+        noise = self._rig.noise
+        if self.averaging:
+            noise = {k: v / 2 for k, v in noise.items()}
+
+        n = self.wave_points
+        self._dt = self.timebase * 10 / n
+        wt = 2 * np.pi * f_if * np.arange(n) * self._dt + self._rig.rng.uniform(0, 2 * np.pi)
+
+        # amplitudes are peak-to-peak, CH1 is ahead of CH2 by the phase
+        for channel, amp, shift in ((1, i_amp, np.radians(phase)), (2, q_amp, 0.0)):
+            scale = self.scales[channel]
+            sigma = amp / 2 * noise['amp'] + scale * noise['adc']
+            volts = amp / 2 * np.cos(wt + shift) + self._rig.rng.normal(0.0, sigma, n)
+            lsb = scale * 8 / 256
+            codes = np.clip(np.round(volts / lsb), -128, 127).astype(np.int16) * 256
+            self._waves[channel] = codes, lsb / 256
+
+    def _add_measurement(self, kind, channels):
+        # the newest measurement goes first in the results, the scope keeps up to 5
+        measurement = kind, channels
+        if measurement in self.measurements:
+            self.measurements.remove(measurement)
+        self.measurements.append(measurement)
+        del self.measurements[:-5]
+
+    def _results(self):
+        t = self._rig.clock.now()
+        count = max(1, int((t - self._cleared_at) * self._rig.acq_rate))
+        signal = self._rig.if_signal(t)
+        noise = self._rig.noise
+        if self.averaging:
+            noise = {k: v / 2 for k, v in noise.items()}
+
+        i_amp, q_amp, phase, f_if = signal if signal else (0.0, 0.0, 0.0, 0.0)
+        amps = {1: i_amp, 2: q_amp}
+
+        def visible(channel):
+            return amps[channel] > self.scales[channel] * 0.05
+
+        fields = list()
+        for kind, channels in reversed(self.measurements):
+            channel = channels[0]
+            scale = self.scales[channel]
+            if kind == 'VAMP':
+                name = f'V amptd({channel})'
+                value = amps[channel] if amps[channel] < scale * 8 * 0.98 else INVALID
+                sigma = amps[channel] * noise['amp'] + scale * noise['adc']
+            elif kind == 'PHAS':
+                name = f'Phase({channels[0]}-{channels[1]})'
+                value = phase if all(visible(c) for c in channels) else INVALID
+                sigma = noise['phase'] * (1 + scale / max(amps[channel], 1e-9) * 0.01)
+            else:
+                name = f'Frequency({channel})'
+                value = f_if if visible(channel) else INVALID
+                sigma = f_if * noise['freq']
+
+            if value == INVALID:
+                current = low = high = mean = std = INVALID
+            else:
+                current = value + self._rig.gauss(sigma)
+                mean = value + self._rig.gauss(sigma / sqrt(count))
+                low = mean - 2.5 * sigma
+                high = mean + 2.5 * sigma
+                std = sigma
+            fields.append(name)
+            fields.extend(f'{v:+.6E}' for v in (current, low, high, mean, std))
+            fields.append(f'{count:d}')
+
+        return ','.join(fields)
+
+
+class SimAnalyzer(SimInstrument):
+    model = 'SIM-SA'
+
+    def reset(self):
+        self.start = 0.5 * GHz
+        self.stop = 1.5 * GHz
+        self.points = 1001
+        self.marker = 1 * GHz
+        self.trace_mode = 'WRIT'
+        self.trace = None
+
+    def _write(self, header, value):
+        if header == 'SENS:FREQ:CENT':
+            span = self.stop - self.start
+            center = _parse(value)
+            self.start, self.stop = center - span / 2, center + span / 2
+        elif header == 'SENS:FREQ:SPAN':
+            center = (self.start + self.stop) / 2
+            span = _parse(value)
+            self.start, self.stop = center - span / 2, center + span / 2
+        elif header == 'SENS:FREQ:STAR':
+            self.start = _parse(value)
+        elif header == 'SENS:FREQ:STOP':
+            self.stop = _parse(value)
+        elif header == 'SENS:SWE:POIN':
+            self.points = int(_parse(value))
+            self.trace = None
+        elif header == 'CALC:MARK1:X:CENT':
+            self.marker = _parse(value)
+        elif header == 'TRAC1:MODE':
+            self.trace_mode = value.upper()
+            self.trace = None
+        elif header == 'INIT:IMM':
+            self._sweep()
+
+    def _read(self, header, value):
+        if header == 'CALC:MARK:Y':
+            return f'{self._marker_level():+.3f}'
+        if header == 'TRAC:DATA':
+            if self.trace is None:
+                self._sweep()
+            return ','.join(f'{v:.3f}' for v in self.trace)
+        return None
+
+    def _marker_level(self):
+        window = max((self.stop - self.start) / 100, 1_000)
+        levels = [level for freq, level in self._rig.spectrum(self._rig.clock.now()) if abs(freq - self.marker) <= window]
+        return max(levels, default=-95.0) + self._rig.gauss(self._rig.noise['sa'])
+
+    def _sweep(self):
+        self._rig.clock.advance(self._rig.latency['sweep'])
+
+        sweep = -95.0 + self._rig.rng.normal(0.0, 1.0, self.points)
+        bin_width = (self.stop - self.start) / max(self.points - 1, 1)
+        for freq, level in self._rig.spectrum(self._rig.clock.now()):
+            center = int(round((freq - self.start) / bin_width))
+            for offset, drop in ((-1, 3.0), (0, 0.0), (1, 3.0)):
+                if 0 <= center + offset < self.points:
+                    sweep[center + offset] = max(sweep[center + offset], level - drop + self._rig.gauss(self._rig.noise['sa']))
+
+        if self.trace_mode == 'MAXH' and self.trace is not None:
+            self.trace = np.maximum(self.trace, sweep)
+        else:
+            self.trace = sweep
+
+
+class SimFactory:
+    def __init__(self, instrument, addr):
+        self._instrument = instrument
+        self.addr = addr
+        self.clock = instrument._rig.clock   # for the controller's settle delays
+
+    def find(self, open_timeout=None):
+        latency = self._instrument._rig.latency['find']
+        if open_timeout is not None and latency * 1000 > open_timeout:
+            self._instrument._rig.clock.advance(open_timeout / 1000)
+            return None
+        self._instrument._rig.clock.advance(latency)
+        if not self.addr:
+            return None
+        self._instrument.addr = self.addr
+        return self._instrument
+
+
+def make_factories(addrs, **params):
+    # same keys as the controller's requiredInstruments
+    rig = SimRig(**params)
+    return {
+        'Осциллограф': SimFactory(rig.osc, addrs['Осциллограф']),
+        'Анализатор': SimFactory(rig.sa, addrs['Анализатор']),
+        'P LO': SimFactory(rig.gen_lo, addrs['P LO']),
+        'P RF': SimFactory(rig.gen_rf, addrs['P RF']),
+        'Источник': SimFactory(rig.src, addrs['Источник']),
+        'Мультиметр': SimFactory(rig.mult, addrs['Мультиметр']),
+    }
+
+
+def _parse(value):
+    match = _number.fullmatch(value)
+    if not match:
+        raise ValueError(f'bad SCPI value: {value}')
+    number, unit = match.groups()
+    return float(number) * _units[unit.upper()]
+
+
+def _on(value):
+    return value.strip().upper() in ('ON', '1')
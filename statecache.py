@@ -0,0 +1,93 @@
+import re
+
+# commands that must reach the instrument every time, even with the same argument
+_uncached = ('*', 'MEAS', 'INIT', 'CDIS', 'APPL', 'DIG')
+
+# setting a node changes its sibling on the same path (scope range sets scale and vice versa)
+_coupled = {
+    'RANG': ('SCAL', ),
+    'SCAL': ('RANG', ),
+}
+
+# setting a node changes these nodes anywhere in the instrument (multiplier changes every output frequency)
+_coupled_anywhere = {
+    'MULT': ('FREQ', ),
+}
+
+_mnemonic = re.compile(r'([A-Z]+)(\d*)')
+
+
+class CachedInstrument:
+    def __init__(self, instrument):
+        self._instrument = instrument
+        self._state = dict()
+
+        self.sent = 0
+        self.skipped = 0
+
+    def __getattr__(self, item):
+        return getattr(self._instrument, item)
+
+    def __repr__(self):
+        return repr(self._instrument)
+
+    def __str__(self):
+        return str(self._instrument)
+
+    def send(self, command):
+        header, _, value = command.strip().partition(' ')
+        header = normalize(header)
+
+        if header == '*RST':
+            self.invalidate()
+
+        if not value or header.startswith(_uncached):
+            return self._send(command)
+
+        value = value.strip().upper()
+        if self._state.get(header) == value:
+            self.skipped += 1
+            return None
+
+        self._forget_coupled(header)
+        self._state[header] = value
+        return self._send(command)
+
+    def query(self, question):
+        return self._instrument.query(question)
+
+    def invalidate(self):
+        self._state.clear()
+
+    def reset_stats(self):
+        self.sent = 0
+        self.skipped = 0
+
+    def _send(self, command):
+        self.sent += 1
+        return self._instrument.send(command)
+
+    def _forget_coupled(self, header):
+        path, _, node = header.rpartition(':')
+        for sibling in _coupled.get(node, ()):
+            self._state.pop(f'{path}:{sibling}' if path else sibling, None)
+
+        nodes = set(_coupled_anywhere.get(node, ()))
+        if nodes:
+            for cached in [k for k in self._state if k != header and nodes.intersection(k.split(':'))]:
+                del self._state[cached]
+
+
+def normalize(header):
+    # reduce SCPI long/short forms to the short form: 'CHANnel1:OFFSet' and ':CHAN1:OFFS' -> 'CHAN1:OFFS'
+    return ':'.join(_short_form(node) for node in header.lstrip(':').upper().split(':'))
+
+
+def _short_form(node):
+    match = _mnemonic.fullmatch(node)
+    if not match:
+        return node
+    word, suffix = match.groups()
+    if len(word) > 4:
+        word = word[:3] if word[3] in 'AEIOU' else word[:4]
+    return f'{word}{suffix}'
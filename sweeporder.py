@@ -0,0 +1,85 @@
+from math import floor, log2
+
+# expected settle time in seconds, set per instrument in sweep_params.ini
+_generator = {
+    'pow_change': 0.3,   # per power step
+    'freq_change': 0.05,   # per retune
+    'freq_span': 0.02,   # per GHz of retune distance
+}
+_scope = {
+    'range_change': 2.0,   # per change of the expected range (one autoscale pass)
+}
+
+
+class CostModel:
+    def __init__(self, lo=None, rf=None, osc=None):
+        self.lo = {**_generator, **(lo or {})}
+        self.rf = {**_generator, **(rf or {})}
+        self.osc = {**_scope, **(osc or {})}
+
+    @classmethod
+    def from_dict(cls, data):
+        # {'lo': {...}, 'rf': {...}, 'osc': {...}}, or the older flat dict shared by all instruments
+        if any(k in data for k in ('lo', 'rf', 'osc')):
+            return cls(**data)
+        return cls(lo=data, rf=data, osc=data)
+
+    def cost(self, a, b):
+        pow_a, freq_lo_a, freq_rf_a, range_a = a
+        pow_b, freq_lo_b, freq_rf_b, range_b = b
+
+        # both generators settle in the same *OPC? wait, the slower one sets the pace; RF power is fixed in a run
+        lo = _generator_cost(self.lo, pow_a != pow_b, abs(freq_lo_a - freq_lo_b))
+        rf = _generator_cost(self.rf, False, abs(freq_rf_a - freq_rf_b))
+
+        cost = max(lo, rf)
+        if range_a != range_b:
+            cost += self.osc['range_change']
+        return cost
+
+    def total(self, points):
+        return sum(self.cost(a, b) for a, b in zip(points, points[1:]))
+
+
+def plan_order(pow_values, freq_pairs, model, strategy='auto', expected_amp=None):
+    # returns grid indices (pow_index * len(freq_pairs) + freq_index) in measurement order
+    pows = len(pow_values)
+    freqs = len(freq_pairs)
+
+    def range_bin(p, f):
+        # octaves of the expected amplitude, None -- no prediction yet
+        amp = expected_amp(pow_values[p], freq_pairs[f][1]) if expected_amp else None
+        return floor(log2(amp)) if amp and amp > 0 else None
+
+    points = {
+        (p, f): (pow_values[p], freq_pairs[f][0], freq_pairs[f][1], range_bin(p, f))
+        for p in range(pows) for f in range(freqs)
+    }
+
+    serpentine = [(p, f) for p in range(pows) for f in (range(freqs) if p % 2 == 0 else reversed(range(freqs)))]
+    orders = {
+        'canonical': [(p, f) for p in range(pows) for f in range(freqs)],
+        'serpentine': serpentine,
+        'freq_major': [(p, f) for f in range(freqs) for p in (range(pows) if f % 2 == 0 else reversed(range(pows)))],
+    }
+    # grouping by range needs amplitudes, only a resumed run has some for its grid
+    if any(point[3] is not None for point in points.values()):
+        orders['range'] = sorted(serpentine, key=lambda pf: (points[pf][3] is not None, points[pf][3] or 0))
+    elif strategy == 'range':
+        print('sweep order: no expected amplitudes for range order, using serpentine')
+        strategy = 'serpentine'
+
+    if strategy == 'auto':
+        costs = {name: model.total([points[pf] for pf in order]) for name, order in orders.items()}
+        strategy = min(costs, key=costs.get)
+        print('sweep order costs:', {name: round(cost, 1) for name, cost in costs.items()})
+
+    print(f'sweep order: {strategy}')
+    return [p * freqs + f for p, f in orders[strategy]]
+
+
+def _generator_cost(model, pow_changed, freq_distance):
+    cost = model['pow_change'] if pow_changed else 0.0
+    if freq_distance:
+        cost += model['freq_change'] + model['freq_span'] * freq_distance
+    return cost
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class SweepPlan:
+    def __init__(self, secondary, freq_step=None, cal_lo=None, cal_rf=None):
+        # every point of a run, in canonical order: LO power (outer) x LO/RF frequency pair (inner)
+        self.freq_lo_x2 = secondary['is_Flo_x2']
+        self.pow_rf = secondary['Prf']
+
+        self.pow_lo_values = _grid(secondary['Plo_min'], secondary['Plo_max'], secondary['Plo_delta'])
+        self.freq_lo_values = _grid(secondary['Flo_min'], secondary['Flo_max'], freq_step or secondary['Flo_delta'])
+        self.freq_rf_values = _grid(secondary['Frf_min'], secondary['Frf_max'], freq_step or secondary['Frf_delta'])
+        if self.freq_lo_x2:
+            self.freq_lo_values = self.freq_lo_values * 2
+
+        pairs = min(len(self.freq_lo_values), len(self.freq_rf_values))
+        self.mismatch = len(self.freq_lo_values) != len(self.freq_rf_values)
+
+        self.pow_lo = np.repeat(self.pow_lo_values, pairs)
+        self.freq_lo = np.tile(self.freq_lo_values[:pairs], len(self.pow_lo_values))
+        self.freq_rf = np.tile(self.freq_rf_values[:pairs], len(self.pow_lo_values))
+
+        # generator output powers with half of the calibrated path loss added
+        self.gen_pow_lo = np.round(self.pow_lo + (cal_lo.lookup_many(self.pow_lo, self.freq_lo) if cal_lo else 0) / 2, 2)
+        pow_rf = np.full(len(self.freq_rf), float(self.pow_rf))
+        self.gen_pow_rf = np.round(pow_rf + (cal_rf.lookup_many(pow_rf, self.freq_rf) if cal_rf else 0) / 2, 2)
+
+        freq_if = np.abs(self.freq_rf - (self.freq_lo / 2 if self.freq_lo_x2 else self.freq_lo))
+        with np.errstate(divide='ignore'):
+            self.timebase = (1 / (freq_if * 10_000_000)) * 0.01 * secondary['timebase_coeff']
+
+        for values in (self.pow_lo_values, self.freq_lo_values, self.freq_rf_values, self.pow_lo, self.freq_lo,
+                       self.freq_rf, self.gen_pow_lo, self.gen_pow_rf, self.timebase):
+            values.setflags(write=False)
+
+        self.pairs = pairs
+
+    def __len__(self):
+        return len(self.pow_lo)
+
+    def key(self, index):
+        return float(self.pow_lo[index]), float(self.freq_lo[index]), float(self.freq_rf[index])
+
+    def eta(self, measured, elapsed, remaining):
+        # s left for the remaining points, assuming they take as long as the ones measured in this run on average,
+        # points restored from the journal take no time and are neither measured nor remaining
+        if not measured:
+            return None
+        return elapsed / measured * remaining
+
+
+def _grid(start, stop, step):
+    if start == stop or step <= 0:
+        return np.array([round(start, 3)])
+    return np.round(np.arange(start=start, stop=stop + step * 0.001, step=step), 3)
@@ -0,0 +1,74 @@
+import numpy as np
+
+
+class TraceCalibrator:
+    def __init__(self, sa, settle, sweep_points=10001, peak_window=0.3, margin=0.01):
+        self._sa = sa
+        self._settle = settle
+        self._binary = hasattr(sa, 'query_binary_values')
+
+        self.sweep_points = sweep_points
+        self.peak_window = peak_window   # fraction of the frequency step searched around each point
+        self.margin = margin   # GHz, extra span on both sides of the grid
+
+        self._start = 0.0
+        self._stop = 0.0
+
+    def prepare(self, freqs):
+        self._start = max(min(freqs) - self.margin, 0.0)
+        self._stop = max(freqs) + self.margin
+
+        self._sa.send(f':SENS:FREQ:STAR {self._start}GHz')
+        self._sa.send(f':SENS:FREQ:STOP {self._stop}GHz')
+        self._sa.send(f':SENS:SWE:POIN {self.sweep_points}')
+        self._sa.send(':INIT:CONT OFF')
+
+        if self._binary:
+            self._sa.send(':FORM:BORD NORM')
+            self._sa.send(':FORM:TRAC:DATA REAL,32')
+        else:
+            self._sa.send(':FORM:TRAC:DATA ASC')
+
+    def measure(self, token, gen, freqs):
+        # restart max hold for every power level
+        self._sa.send(':TRAC1:MODE WRIT')
+        self._sa.send(':TRAC1:MODE MAXH')
+
+        for freq in freqs:
+            if token.cancelled:
+                return None
+
+            gen.send(f'SOUR:FREQ {freq}GHz')
+            gen.send(f'OUTP:STAT ON')
+            self._settle.wait_opc(gen)
+
+            # single sweep, *OPC? blocks until the sweep completes
+            self._sa.send(':INIT:IMM')
+            self._sa.query('*OPC?')
+
+        return trace_peaks(self._fetch_trace(), self._start, self._stop, freqs, self.peak_window)
+
+    def finish(self):
+        self._sa.send(':FORM:TRAC:DATA ASC')
+        self._sa.send(':TRAC1:MODE WRIT')
+        self._sa.send(':INIT:CONT ON')
+
+    def _fetch_trace(self):
+        if self._binary:
+            return np.array(self._sa.query_binary_values(':TRAC:DATA? TRACE1', datatype='f', is_big_endian=True))
+        return np.array(self._sa.query(':TRAC:DATA? TRACE1').split(','), dtype=float)
+
+
+def trace_peaks(trace, start, stop, freqs, peak_window):
+    trace = np.asarray(trace, dtype=float)
+    freqs = np.asarray(freqs, dtype=float)
+
+    points = len(trace)
+    bin_width = (stop - start) / (points - 1)
+
+    step = np.min(np.diff(np.sort(freqs))) if len(freqs) > 1 else bin_width
+    half_width = max(int(step * peak_window / bin_width), 1)
+
+    centers = np.rint((freqs - start) / bin_width).astype(int)
+    window = np.clip(centers[:, None] + np.arange(-half_width, half_width + 1), 0, points - 1)
+    return trace[window].max(axis=1)
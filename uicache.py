@@ -0,0 +1,59 @@
+import importlib.util
+import os
+import sys
+
+from PyQt5 import uic
+
+# next to the sources, or next to the executable of a frozen build, wherever the program is started from
+base_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
+cache_name = 'ui_cache'
+cache_dir = os.path.join(base_dir, cache_name)
+
+_modules = dict()
+
+
+def load_ui(file_name, widget):
+    # same as uic.loadUi(file_name, widget), but the .ui XML is compiled to python once
+    # and recompiled only when the .ui file changes; returns the widget with the child widgets set on it
+    file_name = os.path.join(base_dir, file_name)
+    name = os.path.splitext(os.path.basename(file_name))[0] + '_ui'
+    module = _modules.get(name)
+    if module is None:
+        try:
+            module = _modules[name] = _load_module(name, _compile(file_name, name))
+        except OSError as ex:
+            # stale cache in a read-only install, parse the .ui every start as before
+            print(f'ui cache: {ex}, loading {file_name} directly')
+            return uic.loadUi(file_name, widget)
+
+    ui = next(getattr(module, attr) for attr in dir(module) if attr.startswith('Ui_'))()
+    ui.setupUi(widget)
+    for attr, value in vars(ui).items():
+        setattr(widget, attr, value)
+    return widget
+
+
+def compile_all(path=base_dir):
+    for file_name in sorted(os.listdir(path)):
+        if file_name.endswith('.ui'):
+            _compile(os.path.join(path, file_name), os.path.splitext(file_name)[0] + '_ui')
+
+
+def _compile(file_name, name):
+    cached = os.path.join(cache_dir, name + '.py')
+    # frozen builds may ship the compiled modules without the .ui sources
+    if os.path.isfile(cached) and (not os.path.isfile(file_name) or os.path.getmtime(cached) >= os.path.getmtime(file_name)):
+        return cached
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cached, mode='wt', encoding='utf-8') as f:
+        uic.compileUi(file_name, f)
+    print(f'compiled {file_name} -> {cached}')
+    return cached
+
+
+def _load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,113 @@
+import numpy as np
+
+# the scope's value for a measurement it could not make
+INVALID = 9.9e37
+
+
+class WaveformCapture:
+    def __init__(self, osc, points=2000, margin=2.2, min_fill=0.1, attempts=4):
+        self._osc = osc
+        self._binary = hasattr(osc, 'query_binary_values')
+
+        self.points = points
+        self.margin = margin   # range / signal amplitude after re-ranging
+        self.min_fill = min_fill   # re-range when the signal takes less of the screen than this
+        self.attempts = attempts
+
+        self.captures = 0
+        self.reranges = 0
+
+    def prepare(self):
+        # the clipping test takes the screen as centered on zero
+        self._osc.send(':CHANnel1:OFFSet 0')
+        self._osc.send(':CHANnel2:OFFSet 0')
+        self._osc.send(f':WAVeform:POINts {self.points}')
+        if self._binary:
+            self._osc.send(':WAVeform:FORMat WORD')
+            self._osc.send(':WAVeform:BYTeorder MSBFirst')
+            self._osc.send(':WAVeform:UNSigned OFF')
+        else:
+            self._osc.send(':WAVeform:FORMat ASCii')
+
+    def finish(self):
+        self._osc.send(':RUN')
+
+    def measure(self, token=None):
+        # peak-to-peak amplitudes per channel, phase of CH1 relative to CH2 (deg), IF (Hz), True if no re-ranging was needed,
+        # a channel still clipped after the last attempt reads INVALID like the scope's own measurements
+        for attempt in range(self.attempts):
+            waves, dt, scales = self._capture()
+            amps, phase, freq = analyze(waves, dt)
+
+            screen = scales * 8
+            clipped = np.abs(waves).max(axis=1) >= screen / 2 * 0.99
+            small = amps < screen * self.min_fill
+            if not (clipped.any() or small.any()) or attempt == self.attempts - 1:
+                break
+            if token is not None and token.cancelled:
+                raise RuntimeError('measurement cancelled')
+
+            # only the channels that are off: a clipped one to four times its screen,
+            # a small one down to the signal, at most by the fill ratio per attempt in case there is no signal
+            for channel in np.flatnonzero(clipped | small):
+                if clipped[channel]:
+                    target = screen[channel] * 4
+                else:
+                    target = max(amps[channel] * self.margin, screen[channel] * self.min_fill)
+                self._osc.send(f':CHANnel{channel + 1}:RANGe {target}')
+            self.reranges += 1
+
+        if clipped.any():
+            amps = np.where(clipped, INVALID, amps)
+            phase = INVALID
+        return amps, phase, freq, attempt == 0 and not clipped.any()
+
+    def _capture(self):
+        self.captures += 1
+        self._osc.send(':DIGitize CHANnel1,CHANnel2')
+
+        waves = list()
+        scales = list()
+        dt = 0.0
+        for channel in (1, 2):
+            self._osc.send(f':WAVeform:SOURce CHANnel{channel}')
+            preamble = [float(v) for v in self._osc.query(':WAVeform:PREamble?').split(',')]
+            dt = preamble[4]
+            y_increment, y_origin, y_reference = preamble[7:10]
+
+            if self._binary:
+                codes = np.array(self._osc.query_binary_values(':WAVeform:DATA?', datatype='h', is_big_endian=True),
+                                 dtype=float)
+                waves.append((codes - y_reference) * y_increment + y_origin)
+            else:
+                waves.append(np.array(self._osc.query(':WAVeform:DATA?').split(','), dtype=float))
+            scales.append(float(self._osc.query(f':CHANnel{channel}:SCALe?')))
+
+        length = min(len(w) for w in waves)
+        return np.array([w[:length] for w in waves]), dt, np.array(scales)
+
+
+def analyze(waves, dt):
+    # FFT peak for a first guess of the frequency, then a least squares sine fit of every channel at that frequency
+    waves = np.asarray(waves, dtype=float)
+    n = waves.shape[1]
+    waves = waves - waves.mean(axis=1, keepdims=True)
+
+    spectrum = np.abs(np.fft.rfft(waves * np.hanning(n), axis=1)) ** 2
+    power = spectrum.sum(axis=0)
+    k = int(np.argmax(power[1:])) + 1
+    if k < len(power) - 1:
+        a, b, c = np.log(power[k - 1:k + 2] + 1e-300)
+        if a - 2 * b + c < 0:   # flat spectrum -- no signal, keep the bin
+            k = k + 0.5 * (a - c) / (a - 2 * b + c)
+    freq = k / (n * dt)
+
+    # x = A cos(wt + phi) = A cos(phi) cos(wt) - A sin(phi) sin(wt)
+    wt = 2 * np.pi * freq * np.arange(n) * dt
+    basis = np.stack([np.cos(wt), np.sin(wt), np.ones(n)], axis=1)
+    coef = np.linalg.lstsq(basis, waves.T, rcond=None)[0]
+
+    amps = 2 * np.hypot(coef[0], coef[1])
+    phases = np.arctan2(-coef[1], coef[0])
+    phase = (np.degrees(phases[0] - phases[1]) + 180) % 360 - 180
+    return amps, float(phase), float(freq)